@@ -0,0 +1,17 @@
+"""
+ASGI config for app project.
+
+It exposes the ASGI callable as a module-level variable named ``application``
+for an ASGI server, e.g. ``uvicorn app.asgi:application``.
+
+Django 2.1 has no ASGI support of its own, the application in core.asgi
+hands each request to Django on a bounded pool of threads.
+"""
+
+import os
+
+from core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+
+application = get_asgi_application()
@@ -36,15 +36,19 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'core',
+    # After core, whose runserver command extends the staticfiles one
+    'django.contrib.staticfiles',
     'user',
     'recipe',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.HealthCheckMiddleware',
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,13 +82,74 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
+# Closed connections are kept in a pool of up to DB_POOL_SIZE connections
+# per process, 0 opens a new connection for each one instead.
+# DB_CONN_MAX_AGE keeps a connection open across requests for that many
+# seconds without a pool, and is ignored with one since the pool keeps them
+# open. Both backends check a kept connection before reusing it.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql_pool' if DB_POOL_SIZE
+        else 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        },
+    }
+}
+
+# Read replicas of the default database, DB_REPLICA_HOSTS is a comma
+# separated list of host[:port][/name]. Recipe reads go to a replica unless
+# the user wrote within the last REPLICA_PIN_SECONDS, the pins are kept in
+# the REPLICA_PIN_CACHE cache which must be shared between processes, a
+# system check fails for the process local default.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    address, _, name = replica.strip().partition('/')
+    host, _, port = address.partition(':')
+    alias = f'replica{index}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        HOST=host,
+        PORT=port,
+        NAME=name or DATABASES['default']['NAME'],
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+REPLICA_PIN_CACHE = os.environ.get('REPLICA_PIN_CACHE', 'default')
+
+# Default cache, CACHE_BACKEND is locmem for a process local cache, database
+# for the CACHE_LOCATION table made by `manage.py createcachetable` or
+# memcached for the comma separated host:port list in CACHE_LOCATION, which
+# needs python-memcached. The replica pins and TOKEN_AUTH_SHARED_CACHE need
+# a cache shared between processes, so replicas default to the database one.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'database': 'django.core.cache.backends.db.DatabaseCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+}
+CACHE_BACKEND = os.environ.get(
+    'CACHE_BACKEND', 'database' if DATABASE_REPLICAS else 'locmem')
+CACHE_LOCATION = os.environ.get(
+    'CACHE_LOCATION', 'cache' if CACHE_BACKEND == 'database' else '')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': (CACHE_LOCATION.split(',')
+                     if CACHE_BACKEND == 'memcached' else CACHE_LOCATION),
     }
 }
 
@@ -108,6 +173,38 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# Passwords are rehashed with the preferred hasher and costs on the next
+# successful login. 'argon2' needs argon2-cffi and 'bcrypt' needs bcrypt.
+
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+
+PASSWORD_HASHER_COST = {
+    'PBKDF2_ITERATIONS': int(
+        os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 120000)
+    ),
+    'ARGON2_TIME_COST': int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2)),
+    'ARGON2_MEMORY_COST': int(
+        os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 512)
+    ),
+    'ARGON2_PARALLELISM': int(
+        os.environ.get('PASSWORD_ARGON2_PARALLELISM', 2)
+    ),
+    'BCRYPT_ROUNDS': int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', 12)),
+}
+
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'core.hashers.PBKDF2PasswordHasher',
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+    'bcrypt': 'core.hashers.BCryptSHA256PasswordHasher',
+}
+
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items()
+    if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.1/topics/i18n/
 
@@ -131,5 +228,76 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Send media files from Django itself ('django') or hand them to the
+# front-end server with X-Accel-Redirect ('x-accel') or X-Sendfile
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'django')
+# Internal location the front-end server maps onto MEDIA_ROOT
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
 
 AUTH_USER_MODEL = 'core.User'
+
+
+# Token authentication cache, SHARED_CACHE names an entry of CACHES shared
+# by all worker processes used instead of the in-process LRU, so a deleted
+# token or deactivated user is rejected by every worker at once, 'default'
+# with CACHE_BACKEND set to database or memcached
+
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 1024)),
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60)),
+    'SHARED_CACHE': os.environ.get('TOKEN_AUTH_SHARED_CACHE') or None,
+}
+
+
+# Recipe API pagination, bulk, export and text search settings
+
+RECIPE_PAGE_SIZE = int(os.environ.get('RECIPE_PAGE_SIZE', 100))
+RECIPE_MAX_PAGE_SIZE = int(os.environ.get('RECIPE_MAX_PAGE_SIZE', 1000))
+
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 1000))
+
+RECIPE_EXPORT_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 500)
+)
+
+# Render list pages from values() rows instead of model instances
+RECIPE_VALUES_LIST = os.environ.get('RECIPE_VALUES_LIST', '') in \
+    ('1', 'true', 'yes')
+
+RECIPE_SEARCH_CONFIG = os.environ.get('RECIPE_SEARCH_CONFIG', 'english')
+
+# Threads generating recipe image variants, 0 generates them in the request
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+
+# Largest accepted recipe image upload in bytes
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(
+    os.environ.get('RECIPE_IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+)
+
+# Name recipe images by a random uuid or by the SHA-256 of their content,
+# storing identical uploads once
+RECIPE_IMAGE_STORAGE = os.environ.get('RECIPE_IMAGE_STORAGE', 'uuid')
+if RECIPE_IMAGE_STORAGE == 'content':
+    DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+
+# Threads handling requests for the ASGI application in app/asgi.py, which
+# bound its concurrent database work, keep it within DB_POOL_SIZE when
+# pooling. Serving it needs an ASGI server such as uvicorn.
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 16))
+
+# Hold each API action to its budget of queries and of queries repeated with
+# other parameters, 'log' warns and 'raise' fails a request over budget with
+# the offending SQL and its stack, 'off' records nothing. Recording costs a
+# stack capture per query, so it is only on for development and the tests,
+# whose runner defaults it to 'raise'.
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'off')
+
+TEST_RUNNER = 'core.testrunner.TestRunner'
+
+# Request metrics served at /metrics, DIRECTORY holds a snapshot per worker
+# process so each of them serves the total of all workers
+METRICS = {
+    'DIRECTORY': os.environ.get('METRICS_DIR') or None,
+    'FLUSH_INTERVAL': float(os.environ.get('METRICS_FLUSH_INTERVAL', 1)),
+}
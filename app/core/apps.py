@@ -1,5 +1,54 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+    pre_delete
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from rest_framework.authtoken.models import Token
+
+        from core import authentication, signals
+        from core.db import routers
+        from core.models import User, Tag, Ingredient, Recipe
+
+        checks.register(routers.check_replica_pin_cache)
+
+        post_delete.connect(authentication.invalidate_token, sender=Token)
+        post_save.connect(authentication.invalidate_user_tokens, sender=User)
+        post_delete.connect(
+            authentication.invalidate_user_tokens,
+            sender=User
+        )
+
+        for model in (Tag, Ingredient, Recipe):
+            post_save.connect(signals.bump_library_version, sender=model)
+            post_delete.connect(signals.bump_library_version, sender=model)
+        for through in (Recipe.tags.through, Recipe.ingredients.through):
+            m2m_changed.connect(
+                signals.bump_library_version_m2m,
+                sender=through
+            )
+        pre_delete.connect(signals.suspend_library_version, sender=User)
+        post_delete.connect(signals.resume_library_version, sender=User)
+
+        post_save.connect(signals.refresh_recipe_search, sender=Recipe)
+        for through in (Recipe.tags.through, Recipe.ingredients.through):
+            m2m_changed.connect(
+                signals.refresh_recipe_search_m2m,
+                sender=through
+            )
+        for model in (Tag, Ingredient):
+            post_save.connect(
+                signals.refresh_linked_recipe_search,
+                sender=model
+            )
+            pre_delete.connect(signals.collect_linked_recipes, sender=model)
+            post_delete.connect(
+                signals.refresh_unlinked_recipe_search,
+                sender=model
+            )
+
+        post_delete.connect(signals.release_recipe_image, sender=Recipe)
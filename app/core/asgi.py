@@ -0,0 +1,243 @@
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+from recipe.uploadhandlers import MULTIPART_OVERHEAD
+
+
+class RequestTooLarge(Exception):
+    """The request body is over the size the application reads"""
+
+
+class ASGIHandler:
+    """ASGI application running Django on a bounded pool of threads
+
+    Django 2.1 views and the ORM are synchronous, so the request body is
+    read on the event loop, the request is handled by the WSGI handler on
+    one of max_workers threads and the response is written back on the
+    loop. A slow client holds a thread only while a streaming response is
+    sent to it, and at most max_workers requests use the database at once.
+    A body over max_body_size is answered with a 413 without being read,
+    or as soon as the data received crosses it.
+    """
+
+    def __init__(self, max_workers=None, max_body_size=None):
+        self.wsgi = WSGIHandler()
+        self.max_workers = max_workers or settings.ASGI_THREADS
+        self.max_body_size = max_body_size or default_max_body_size()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='asgi'
+                )
+            return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope type {scope["type"]}')
+
+        try:
+            body = await self.read_body(scope, receive)
+        except RequestTooLarge:
+            await self.reject_too_large(send)
+            return
+        if body is None:
+            return
+
+        try:
+            loop = asyncio.get_event_loop()
+            response = await loop.run_in_executor(
+                self.executor,
+                self.handle,
+                build_environ(scope, body),
+                loop,
+                send
+            )
+        finally:
+            body.close()
+
+        if response is not None:
+            status, headers, content = response
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': headers,
+            })
+            await send({'type': 'http.response.body', 'body': content})
+
+    async def lifespan(self, receive, send):
+        """Answer the startup and shutdown events of the server"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                with self._executor_lock:
+                    executor, self._executor = self._executor, None
+                if executor is not None:
+                    executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, scope, receive):
+        """Return the request body as a file, or None on a disconnect
+
+        Raises RequestTooLarge when the Content-Length or the data received
+        is over max_body_size.
+        """
+        content_length = dict(scope.get('headers', ())).get(b'content-length')
+        try:
+            too_large = int(content_length) > self.max_body_size
+        except (TypeError, ValueError):
+            too_large = False
+        if too_large:
+            raise RequestTooLarge()
+
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        received = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            chunk = message.get('body', b'')
+            received += len(chunk)
+            if received > self.max_body_size:
+                body.close()
+                raise RequestTooLarge()
+            body.write(chunk)
+            if not message.get('more_body', False):
+                break
+
+        body.seek(0)
+        return body
+
+    async def reject_too_large(self, send):
+        """Answer a request whose body is too large with a 413"""
+        content = json.dumps({'detail': 'Request body is too large.'})
+        await send({
+            'type': 'http.response.start',
+            'status': 413,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(content)).encode()),
+                (b'connection', b'close'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': content.encode()})
+
+    def handle(self, environ, loop, send):
+        """Run Django on a worker thread
+
+        A buffered response is returned as (status, headers, body) for the
+        loop to send. A streaming response is sent from this thread, which
+        keeps the database cursors it iterates on the thread that opened
+        them, and None is returned.
+        """
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in response_headers
+            ]
+
+        result = self.wsgi(environ, start_response)
+        try:
+            if not getattr(result, 'streaming', False):
+                return started['status'], started['headers'], \
+                    b''.join(result)
+
+            def send_threadsafe(message):
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            send_threadsafe({
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': started['headers'],
+            })
+            for chunk in result:
+                if chunk:
+                    send_threadsafe({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            send_threadsafe({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Fires request_finished, closing this thread's connections
+            result.close()
+
+
+def build_environ(scope, body):
+    """Return the WSGI environ of an ASGI HTTP scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': _latin1(scope.get('root_path', '')),
+        'PATH_INFO': _latin1(scope['path']),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'REMOTE_ADDR': str(client[0]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        if key in environ:
+            separator = '; ' if key == 'HTTP_COOKIE' else ','
+            value = f'{environ[key]}{separator}{value}'
+        environ[key] = value
+
+    return environ
+
+
+def default_max_body_size():
+    """Return the largest body of an image upload or other request data"""
+    return max(
+        settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+        settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0
+    )
+
+
+def get_asgi_application():
+    """Set up Django and return the ASGI application"""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
+
+
+def _latin1(path):
+    # WSGI carries the raw bytes of the path in a latin-1 string
+    return path.encode('utf-8').decode('latin-1')
@@ -0,0 +1,154 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """Bounded LRU of token key to (user, token) entries with a TTL
+
+    When a shared cache alias is configured it is used instead of the
+    in-process LRU. A token looked up by one worker then does not hit the
+    database again in another, and an invalidation by one worker applies
+    to all of them rather than only after the TTL.
+    """
+
+    def __init__(self, max_size, ttl, shared_cache=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_cache = shared_cache
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached (user, token) for the key or None"""
+        if self.shared_cache is not None:
+            return caches[self.shared_cache].get(self._shared_key(key))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                user, token, expires = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return user, token
+                self._remove(key)
+
+        return None
+
+    def set(self, key, user, token):
+        """Cache the user and token authenticated by the key"""
+        if self.shared_cache is None:
+            self._store(key, user, token)
+            return
+
+        caches[self.shared_cache].set_many({
+            self._shared_key(key): (user, token),
+            self._shared_user_key(user.pk): key,
+        }, self.ttl)
+
+    def invalidate(self, key):
+        """Drop the entry of a token key"""
+        with self._lock:
+            self._remove(key)
+        if self.shared_cache is not None:
+            caches[self.shared_cache].delete(self._shared_key(key))
+
+    def invalidate_user(self, user_id):
+        """Drop the entries of every token of a user"""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+        if self.shared_cache is not None:
+            cache = caches[self.shared_cache]
+            key = cache.get(self._shared_user_key(user_id))
+            if key is not None:
+                cache.delete_many([
+                    self._shared_key(key),
+                    self._shared_user_key(user_id),
+                ])
+
+    def clear(self):
+        """Drop every in-process entry"""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _store(self, key, user, token):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (user, token, time.monotonic() + self.ttl)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[0].pk)
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[entry[0].pk]
+
+    def _shared_key(self, key):
+        return f'auth:token:{key}'
+
+    def _shared_user_key(self, user_id):
+        return f'auth:user-token:{user_id}'
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_AUTH_CACHE['MAX_SIZE'],
+    ttl=settings.TOKEN_AUTH_CACHE['TTL'],
+    shared_cache=settings.TOKEN_AUTH_CACHE['SHARED_CACHE'],
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that caches the token to user lookup"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, copy.copy(user), token)
+            return user, token
+
+        user, token = cached
+        return copy.copy(user), token
+
+
+def get_token_key(user):
+    """Return the key of the user's token, creating it on first login
+
+    An existing token is read without writing, and concurrent first logins
+    settle on whichever token was inserted first.
+    """
+    keys = Token.objects.filter(user=user).values_list('key', flat=True)
+    key = keys.first()
+    if key is None:
+        try:
+            with transaction.atomic():
+                key = Token.objects.create(user=user).key
+        except IntegrityError:
+            key = keys.get()
+
+    return key
+
+
+def invalidate_token(sender, instance, **kwargs):
+    """Drop the cache entry of a deleted token"""
+    token_cache.invalidate(instance.key)
+
+
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Drop the cache entries of a changed or deleted user"""
+    token_cache.invalidate_user(instance.pk)
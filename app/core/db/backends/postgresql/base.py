@@ -0,0 +1,32 @@
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend checking persistent connections before reuse
+
+    With CONN_MAX_AGE a connection kept from an earlier request is checked
+    with a round trip on its first use in the next one, and replaced when
+    the server closed it in between. Connections closed at the end of each
+    request are never checked.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_needed = False
+
+    def connect(self):
+        # A new connection needs no check, and connecting re-enters
+        # ensure_connection() through set_autocommit()
+        self.health_check_needed = False
+        super().connect()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_needed = True
+
+    def ensure_connection(self):
+        if self.connection is not None and self.health_check_needed:
+            self.health_check_needed = False
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
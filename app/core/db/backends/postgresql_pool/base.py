@@ -0,0 +1,54 @@
+import time
+
+from core.db.backends.postgresql import base
+from core.db.backends.postgresql_pool.creation import DatabaseCreation
+from core.db.backends.postgresql_pool.pool import get_pool, pool_stats
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend keeping closed connections in a bounded pool
+
+    The pool is configured by the POOL entry of the database settings with
+    MAX_SIZE and TIMEOUT. The pool keeps connections open across requests,
+    so CONN_MAX_AGE is ignored and each connection goes back to the pool
+    at the end of the request. A connection kept by a thread instead would
+    hold its slot after the thread exits, as runserver's threads do after
+    every request.
+    """
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(
+            self.alias,
+            conn_params,
+            self.settings_dict.get('POOL', {})
+        )
+        return self.pool.get(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            )
+        )
+
+    def connect(self):
+        super().connect()
+        # Obsolete at once, so the end of the request returns it
+        self.close_at = time.time()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            # Closed inside an atomic block the connection stays referenced
+            # until the block exits, so it must not be handed out again
+            if self.in_atomic_block:
+                self.pool.discard(self.connection)
+            else:
+                self.pool.put(self.connection)
+
+    def pool_stats(self):
+        """Return the size and counters of this database's pools"""
+        return pool_stats(self.alias)
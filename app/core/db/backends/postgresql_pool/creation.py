@@ -0,0 +1,11 @@
+from django.db.backends.postgresql import creation
+
+from core.db.backends.postgresql_pool.pool import close_pools
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would keep the database from being dropped
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
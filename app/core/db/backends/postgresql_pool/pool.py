@@ -0,0 +1,176 @@
+import os
+import threading
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+from django.db.utils import OperationalError
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+class ConnectionPool:
+    """Bounded pool of psycopg2 connections to one database
+
+    At most max_size connections are open at a time, in use or idle, and a
+    checkout waits up to timeout seconds for one to be returned. Idle
+    connections make a round trip before they are handed out again.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.in_use = 0
+        self.counts = dict.fromkeys(
+            ('created', 'reused', 'discarded', 'timeouts'), 0
+        )
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def get(self, connect):
+        """Check out an idle connection, or open one with connect()"""
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count('timeouts')
+            raise OperationalError(
+                f'No database connection available within {self.timeout}s'
+            )
+
+        try:
+            connection = self._pop_usable()
+            if connection is None:
+                connection = connect()
+                self._count('created')
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+        return connection
+
+    def put(self, connection):
+        """Return a checked out connection, closing it if it is unusable"""
+        reusable = self._reset(connection)
+        with self._lock:
+            self.in_use -= 1
+            if reusable:
+                self._idle.append(connection)
+            else:
+                self.counts['discarded'] += 1
+        if not reusable:
+            self._close(connection)
+        self._slots.release()
+
+    def discard(self, connection):
+        """Close a checked out connection instead of returning it"""
+        with self._lock:
+            self.in_use -= 1
+            self.counts['discarded'] += 1
+        self._close(connection)
+        self._slots.release()
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for connection in idle:
+            self._close(connection)
+
+    def stats(self):
+        """Return the pool size and checkout counters"""
+        with self._lock:
+            return dict(
+                self.counts,
+                max_size=self.max_size,
+                in_use=self.in_use,
+                idle=len(self._idle),
+            )
+
+    def _pop_usable(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection = self._idle.pop()
+
+            if self._is_usable(connection):
+                self._count('reused')
+                return connection
+            self._count('discarded')
+            self._close(connection)
+
+    def _is_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except psycopg2.Error:
+            return False
+        return self._reset(connection)
+
+    def _reset(self, connection):
+        """Roll back an open transaction, True if the connection is idle"""
+        if connection.closed:
+            return False
+        try:
+            status = connection.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+
+def get_pool(alias, conn_params, options):
+    """Return the pool of an alias for the connection parameters"""
+    global _pools_pid
+    key = (alias, tuple(sorted((k, str(v)) for k, v in conn_params.items())))
+    with _pools_lock:
+        # Connections inherited from a parent process are not ours to use
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+            )
+        return pool
+
+
+def close_pools(alias):
+    """Close and forget every pool of an alias"""
+    with _pools_lock:
+        keys = [key for key in _pools if key[0] == alias]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats(alias):
+    """Return the combined stats of the pools of an alias"""
+    totals = {}
+    with _pools_lock:
+        pools = [pool for key, pool in _pools.items() if key[0] == alias]
+    for pool in pools:
+        for name, value in pool.stats().items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
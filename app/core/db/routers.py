@@ -0,0 +1,92 @@
+import random
+import threading
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+_state = threading.local()
+
+
+class ReplicaRouter:
+    """Route reads to a replica while the current request allows it
+
+    Everything else, and every write, goes to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'alias', None) or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def use_replica():
+    """Send the reads of the current thread to one of the replicas"""
+    if settings.DATABASE_REPLICAS:
+        _state.alias = random.choice(settings.DATABASE_REPLICAS)
+
+
+def use_primary():
+    """Send the reads of the current thread to the default database"""
+    _state.alias = None
+
+
+def replica_alias():
+    """Return the replica reads currently go to, None for the primary"""
+    return getattr(_state, 'alias', None)
+
+
+def pin_to_primary(user_id):
+    """Keep the user's reads on the primary while their write replicates"""
+    caches[settings.REPLICA_PIN_CACHE].set(
+        _pin_key(user_id),
+        True,
+        settings.REPLICA_PIN_SECONDS
+    )
+
+
+def is_pinned(user_id):
+    """Return whether the user wrote within the pin window"""
+    return bool(caches[settings.REPLICA_PIN_CACHE].get(_pin_key(user_id)))
+
+
+def check_replica_pin_cache(app_configs, **kwargs):
+    """Require a pin cache shared by all processes when using replicas
+
+    A cache local to one process only pins the reads that the process
+    serves, so other workers could serve a user's next read from a
+    replica that does not have the write yet.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return []
+    cache = caches[settings.REPLICA_PIN_CACHE]
+    if not isinstance(cache, (LocMemCache, DummyCache)):
+        return []
+
+    return [checks.Error(
+        f'REPLICA_PIN_CACHE "{settings.REPLICA_PIN_CACHE}" uses '
+        f'{type(cache).__name__}, which is not shared between processes.',
+        hint='Set CACHE_BACKEND to database or memcached, point '
+             'REPLICA_PIN_CACHE at another shared cache, or unset '
+             'DB_REPLICA_HOSTS.',
+        id='core.E001',
+    )]
+
+
+def _pin_key(user_id):
+    return f'db:primary-pin:{user_id}'
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 SHA256 with the iteration count from PASSWORD_HASHER_COST"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHER_COST['PBKDF2_ITERATIONS']
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2 with the costs from PASSWORD_HASHER_COST"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_HASHER_COST['ARGON2_TIME_COST']
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_HASHER_COST['ARGON2_MEMORY_COST']
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_HASHER_COST['ARGON2_PARALLELISM']
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """bcrypt SHA256 with the rounds from PASSWORD_HASHER_COST"""
+
+    @property
+    def rounds(self):
+        return settings.PASSWORD_HASHER_COST['BCRYPT_ROUNDS']
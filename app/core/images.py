@@ -0,0 +1,167 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, features
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+
+from core.models import Recipe, ImageBlob, LibraryVersion
+
+
+logger = logging.getLogger(__name__)
+
+# (model field, file name suffix, bounding box, Pillow format, extension)
+VARIANTS = (
+    ('image_thumbnail', 'thumb', (200, 200), 'JPEG', 'jpg'),
+    ('image_medium', 'medium', (800, 800), 'JPEG', 'jpg'),
+    ('image_webp', 'medium', (800, 800), 'WEBP', 'webp'),
+)
+VARIANT_FIELDS = tuple(variant[0] for variant in VARIANTS)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(name, suffix, extension):
+    """Return the file name of a variant stored next to the original"""
+    root, _ = os.path.splitext(name)
+    return f'{root}_{suffix}.{extension}'
+
+
+def reset(recipe):
+    """Clear the variants of a recipe whose image is being replaced"""
+    for field in VARIANT_FIELDS:
+        setattr(recipe, field, None)
+    recipe.image_status = Recipe.IMAGE_PENDING
+
+
+def retain(recipe, previous_name=None):
+    """Count the reference of a recipe to its new content addressed image
+
+    The reference to the image it replaced is released.
+    """
+    if settings.RECIPE_IMAGE_STORAGE != 'content':
+        return
+
+    ImageBlob.objects.acquire(recipe.image.name)
+    if previous_name:
+        release(previous_name, recipe.image.storage)
+
+
+def release(name, storage):
+    """Drop a reference to an image, deleting its files with the last one"""
+    if settings.RECIPE_IMAGE_STORAGE != 'content':
+        return
+
+    if ImageBlob.objects.release(name):
+        transaction.on_commit(lambda: _delete_unreferenced(name, storage))
+
+
+def _delete_unreferenced(name, storage):
+    """Delete an image and its variants unless it was referenced again"""
+    if ImageBlob.objects.filter(name=name).exists():
+        return
+
+    storage.delete(name)
+    for _, suffix, _, _, extension in VARIANTS:
+        storage.delete(variant_name(name, suffix, extension))
+
+
+def schedule(recipe):
+    """Queue generating the variants of a saved recipe image
+
+    With RECIPE_IMAGE_WORKERS set to 0 the variants are generated before
+    returning, otherwise on the worker pool once the upload is committed.
+    """
+    if settings.RECIPE_IMAGE_WORKERS == 0:
+        process_recipe_image(recipe.id)
+        recipe.refresh_from_db(fields=VARIANT_FIELDS + ('image_status',))
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(_run, recipe.id)
+        )
+
+
+def get_executor():
+    """Return the process wide pool of image workers"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-image'
+            )
+        return _executor
+
+
+def process_recipe_image(recipe_id):
+    """Generate and store the resized variants of a recipe image"""
+    recipe = Recipe.objects.filter(id=recipe_id) \
+        .only('id', 'user_id', 'image').first()
+    if recipe is None or not recipe.image:
+        return
+
+    name = recipe.image.name
+    storage = recipe.image.storage
+    variants = [
+        variant for variant in VARIANTS
+        if variant[3] != 'WEBP' or features.check('webp')
+    ]
+    fields = {'image_status': Recipe.IMAGE_READY}
+    names = {
+        field: variant_name(name, suffix, extension)
+        for field, suffix, _, _, extension in variants
+    }
+    # Content addressed images share the variants of an earlier upload
+    if all(storage.exists(variant) for variant in names.values()):
+        fields.update(names)
+        _save_variants(recipe, name, fields)
+        return
+
+    try:
+        with storage.open(name, 'rb') as f:
+            original = Image.open(f)
+            original.load()
+        if original.mode not in ('RGB', 'L'):
+            original = original.convert('RGB')
+
+        for field, _, size, image_format, _ in variants:
+            variant = original.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+            buffer = BytesIO()
+            variant.save(buffer, image_format, quality=85)
+            fields[field] = storage.save(
+                names[field],
+                ContentFile(buffer.getvalue())
+            )
+    except (OSError, ValueError):
+        logger.exception('Failed to process image %s', name)
+        fields = {'image_status': Recipe.IMAGE_FAILED}
+
+    _save_variants(recipe, name, fields)
+
+
+def _save_variants(recipe, name, fields):
+    """Store the processing result unless the image was replaced meanwhile
+
+    The update sends no post_save, so the library version is bumped here
+    for conditional requests to see the new status and variants.
+    """
+    updated = Recipe.objects.filter(id=recipe.id, image=name).update(**fields)
+    if updated:
+        LibraryVersion.objects.bump(recipe.user_id)
+
+
+def _run(recipe_id):
+    """Process an image on a worker thread and release its connection"""
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception('Failed to process image of recipe %s', recipe_id)
+    finally:
+        connections.close_all()
@@ -0,0 +1,386 @@
+import json
+import math
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import chain
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, \
+    WSGIRequestHandler, get_internal_wsgi_application
+
+from core import images
+from core.asgi import ASGIHandler
+from core.authentication import get_token_key
+from core.models import Tag, Ingredient, Recipe
+from recipe import bulk
+
+
+EMAIL_PREFIX = 'benchmark-'
+PASSWORD = 'benchmark-password'
+SCENARIOS = (
+    'token', 'recipe-list', 'recipe-filter', 'recipe-detail',
+    'recipe-create', 'recipe-upload-image', 'tag-list', 'ingredient-list',
+)
+SERVERS = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the API end to end"""
+    help = 'Seed a dataset, drive the API with concurrent clients and ' \
+           'report throughput and latency percentiles as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=200,
+            help='Recipes seeded per user'
+        )
+        parser.add_argument('--tags', type=int, default=20,
+                            help='Tags seeded per user')
+        parser.add_argument('--ingredients', type=int, default=50,
+                            help='Ingredients seeded per user')
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Requests made per scenario'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Clients making requests at the same time'
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            dest='scenarios',
+            choices=SCENARIOS,
+            help='Scenario to run, repeatable, defaults to all of them'
+        )
+        parser.add_argument(
+            '--server',
+            action='append',
+            dest='servers',
+            choices=SERVERS,
+            help='Server started in this process, repeatable to compare '
+                 'them, defaults to wsgi. asgi needs uvicorn installed'
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Benchmark a running server using the same database '
+                 'instead of one started in this process'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the seeded users and their libraries, whose emails '
+                 'start with the email_prefix of the report'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        servers = options['servers'] or ['wsgi']
+        if 'asgi' in servers and options['base_url'] is None:
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError('The asgi server needs uvicorn installed')
+
+        rng = random.Random(options['seed'])
+        # Unique per run, so existing users are never touched
+        prefix = f'{EMAIL_PREFIX}{uuid.uuid4().hex[:8]}-'
+        results = {}
+        try:
+            self.stderr.write('Seeding benchmark data ...')
+            users = seed(options, rng, prefix)
+            for server_name in servers:
+                stop = None
+                base_url = options['base_url']
+                if base_url is None:
+                    port, stop = start_server(server_name)
+                    base_url = f'http://127.0.0.1:{port}'
+
+                try:
+                    results[server_name] = {}
+                    for name in options['scenarios'] or SCENARIOS:
+                        self.stderr.write(f'Running {name} on {server_name}')
+                        scenario = Scenario(name, base_url, users, rng)
+                        results[server_name][name] = run(
+                            scenario,
+                            options['requests'],
+                            options['concurrency']
+                        )
+                finally:
+                    if stop is not None:
+                        stop()
+        finally:
+            if not options['keep']:
+                cleanup(prefix)
+
+        self.stdout.write(json.dumps({
+            'config': {
+                name: options[name]
+                for name in ('users', 'recipes', 'tags', 'ingredients',
+                             'requests', 'concurrency', 'seed')
+            },
+            'base_url': options['base_url'],
+            'email_prefix': prefix,
+            'servers': results,
+        }, indent=2))
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(name):
+    """Serve the application on a free local port in a thread
+
+    Returns the port and a function stopping the server.
+    """
+    if name == 'asgi':
+        return start_asgi_server()
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+    server.daemon_threads = True
+    server.set_app(get_internal_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    return server.server_address[1], stop
+
+
+def start_asgi_server():
+    """Serve the ASGI application with uvicorn"""
+    import uvicorn
+
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(
+        ASGIHandler(),
+        log_level='warning',
+        lifespan='on',
+    ))
+    # Signals can only be handled on the main thread
+    server.install_signal_handlers = lambda: None
+    thread = threading.Thread(
+        target=server.run,
+        kwargs={'sockets': [sock]},
+        daemon=True
+    )
+    thread.start()
+    while not server.started and thread.is_alive():
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+        sock.close()
+
+    return sock.getsockname()[1], stop
+
+
+def seed(options, rng, prefix):
+    """Create the benchmark users and libraries, returning their details"""
+    users = []
+    for index in range(options['users']):
+        user = get_user_model().objects.create_user(
+            f'{prefix}{index}@example.com',
+            PASSWORD
+        )
+        tags = Tag.objects.bulk_create([
+            Tag(user=user, name=f'Tag {i}') for i in range(options['tags'])
+        ])
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(user=user, name=f'Ingredient {i}')
+            for i in range(options['ingredients'])
+        ])
+        tag_ids = [tag.id for tag in tags]
+        ingredient_ids = [ingredient.id for ingredient in ingredients]
+        recipes = bulk.create_recipes(user, [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': rng.randint(5, 120),
+                'price': rng.randint(100, 5000) / 100,
+                'tags': rng.sample(tag_ids, min(3, len(tag_ids))),
+                'ingredients': rng.sample(
+                    ingredient_ids,
+                    min(8, len(ingredient_ids))
+                ),
+            }
+            for i in range(options['recipes'])
+        ], batch_size=1000)
+        users.append({
+            'email': user.email,
+            'token': get_token_key(user),
+            'recipe_ids': [recipe.id for recipe in recipes],
+            'tag_ids': tag_ids,
+        })
+
+    return users
+
+
+def cleanup(prefix):
+    """Delete the users seeded by one benchmark run and their image files"""
+    files = list(
+        Recipe.objects.filter(user__email__startswith=prefix, image__gt='')
+        .values_list('image', *images.VARIANT_FIELDS)
+    )
+    get_user_model().objects.filter(email__startswith=prefix).delete()
+    if settings.RECIPE_IMAGE_STORAGE == 'content':
+        # Released with the references of the deleted recipes
+        return
+
+    storage = Recipe._meta.get_field('image').storage
+    for name in filter(None, chain.from_iterable(files)):
+        storage.delete(name)
+
+
+class Scenario:
+    """Builds the requests of one benchmarked endpoint"""
+
+    def __init__(self, name, base_url, users, rng):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.users = users
+        self.rng = rng
+        self._lock = threading.Lock()
+        self._image = None
+
+    def request(self):
+        """Return the next urllib request of the scenario"""
+        with self._lock:
+            user = self.rng.choice(self.users)
+            recipe_id = self.rng.choice(user['recipe_ids']) \
+                if user['recipe_ids'] else 0
+            tag_ids = self.rng.sample(
+                user['tag_ids'],
+                min(2, len(user['tag_ids']))
+            )
+
+        headers = {'Authorization': f'Token {user["token"]}'}
+        if self.name == 'token':
+            return self._json('/api/user/token/', {
+                'email': user['email'],
+                'password': PASSWORD,
+            }, {})
+        elif self.name == 'recipe-list':
+            return self._get('/api/recipe/recipes/', headers)
+        elif self.name == 'recipe-filter':
+            tags = ','.join(str(pk) for pk in tag_ids)
+            return self._get(f'/api/recipe/recipes/?tags={tags}', headers)
+        elif self.name == 'recipe-detail':
+            return self._get(f'/api/recipe/recipes/{recipe_id}/', headers)
+        elif self.name == 'recipe-create':
+            return self._json('/api/recipe/recipes/', {
+                'title': 'Benchmark recipe',
+                'time_minutes': 10,
+                'price': '5.00',
+                'tags': tag_ids,
+                'ingredients': [],
+            }, headers)
+        elif self.name == 'recipe-upload-image':
+            return self._upload(
+                f'/api/recipe/recipes/{recipe_id}/upload-image/',
+                headers
+            )
+        elif self.name == 'tag-list':
+            return self._get('/api/recipe/tags/', headers)
+
+        return self._get('/api/recipe/ingredients/', headers)
+
+    def _get(self, path, headers):
+        return Request(self.base_url + path, headers=headers)
+
+    def _json(self, path, data, headers):
+        return Request(
+            self.base_url + path,
+            data=json.dumps(data).encode('utf-8'),
+            headers=dict(headers, **{'Content-Type': 'application/json'}),
+        )
+
+    def _upload(self, path, headers):
+        if self._image is None:
+            buffer = BytesIO()
+            Image.new('RGB', (640, 480), 'orange').save(buffer, 'JPEG')
+            self._image = buffer.getvalue()
+
+        boundary = uuid.uuid4().hex
+        body = b''.join((
+            f'--{boundary}\r\n'.encode('ascii'),
+            b'Content-Disposition: form-data; name="image"; '
+            b'filename="benchmark.jpg"\r\n',
+            b'Content-Type: image/jpeg\r\n\r\n',
+            self._image,
+            f'\r\n--{boundary}--\r\n'.encode('ascii'),
+        ))
+        return Request(self.base_url + path, data=body, headers=dict(
+            headers,
+            **{'Content-Type': f'multipart/form-data; boundary={boundary}'}
+        ))
+
+
+def run(scenario, requests, concurrency):
+    """Make the requests of a scenario and summarize their latencies"""
+    def call(_):
+        request = scenario.request()
+        started = time.perf_counter()
+        try:
+            with urlopen(request, timeout=60) as response:
+                response.read()
+                ok = response.status < 400
+        except HTTPError as e:
+            e.read()
+            ok = False
+        except URLError:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests': requests,
+        'errors': sum(1 for _, ok in results if not ok),
+        'throughput_rps': round(requests / elapsed, 2) if elapsed else 0,
+        'mean_ms': _ms(sum(latencies) / len(latencies)) if latencies else 0,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p90_ms': _ms(percentile(latencies, 90)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(latencies[-1]) if latencies else 0,
+    }
+
+
+def percentile(values, percent):
+    """Return the nearest rank percentile of sorted values"""
+    if not values:
+        return 0
+    rank = math.ceil(percent / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
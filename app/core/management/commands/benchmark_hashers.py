@@ -0,0 +1,80 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import get_hasher, get_hashers_by_algorithm
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Django command to measure password hashes per second per core"""
+    help = 'Measure the throughput of the configured password hashers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hasher',
+            action='append',
+            dest='hashers',
+            help='Algorithm to measure, repeatable, defaults to every '
+                 'configured hasher'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=2.0,
+            help='Seconds to hash for per process'
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Processes hashing in parallel, one per core to measure '
+                 'the whole machine'
+        )
+
+    def handle(self, *args, **options):
+        configured = get_hashers_by_algorithm()
+        algorithms = options['hashers'] or list(configured)
+        unknown = [name for name in algorithms if name not in configured]
+        if unknown:
+            raise CommandError(
+                f'Hashers {", ".join(unknown)} are not in PASSWORD_HASHERS'
+            )
+        processes = max(options['processes'], 1)
+        self.stdout.write(
+            f'{os.cpu_count()} cores, {processes} process(es), '
+            f'{options["duration"]}s each'
+        )
+
+        for algorithm in algorithms:
+            try:
+                get_hasher(algorithm).encode('benchmark', 'salt')
+            except ValueError as e:
+                # The library of an optional hasher is not installed
+                self.stdout.write(f'{algorithm}: unavailable ({e})')
+                continue
+
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                rates = list(executor.map(
+                    hash_rate,
+                    [algorithm] * processes,
+                    [options['duration']] * processes
+                ))
+
+            self.stdout.write(
+                f'{algorithm}: {sum(rates) / processes:.1f} hashes/s per '
+                f'process, {sum(rates):.1f} hashes/s total'
+            )
+
+
+def hash_rate(algorithm, duration):
+    """Return the hashes per second of one process over the duration"""
+    hasher = get_hasher(algorithm)
+    count = 0
+    started = time.perf_counter()
+    while True:
+        hasher.encode('benchmark password', hasher.salt())
+        count += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= duration:
+            return count / elapsed
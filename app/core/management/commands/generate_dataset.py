@@ -0,0 +1,366 @@
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Tag, Ingredient, Recipe, LibraryVersion
+
+
+PASSWORD = 'dataset-password'
+TAG_WORDS = (
+    'Vegan', 'Vegetarian', 'Dessert', 'Breakfast', 'Dinner', 'Lunch',
+    'Quick', 'Spicy', 'Healthy', 'Comfort', 'Baking', 'Italian', 'Mexican',
+    'Indian', 'Thai', 'Japanese', 'French', 'Greek', 'Snack', 'Soup',
+    'Salad', 'Grill', 'Gluten Free', 'Low Carb', 'Party', 'Summer',
+    'Winter', 'Kids', 'Budget', 'Seafood',
+)
+INGREDIENT_WORDS = (
+    'Salt', 'Pepper', 'Olive Oil', 'Garlic', 'Onion', 'Butter', 'Flour',
+    'Sugar', 'Egg', 'Milk', 'Tomato', 'Lemon', 'Rice', 'Chicken', 'Beef',
+    'Potato', 'Carrot', 'Basil', 'Parsley', 'Cheese', 'Cream', 'Ginger',
+    'Chili', 'Cumin', 'Paprika', 'Honey', 'Mushroom', 'Spinach', 'Pasta',
+    'Salmon', 'Shrimp', 'Tofu', 'Lentils', 'Chickpeas', 'Coconut Milk',
+    'Soy Sauce', 'Vinegar', 'Yogurt', 'Bread', 'Avocado',
+)
+ADJECTIVES = (
+    'Classic', 'Easy', 'Crispy', 'Creamy', 'Roasted', 'Smoky', 'Spicy',
+    'Fresh', 'Slow Cooked', 'Grilled', 'Baked', 'Rustic', 'Zesty',
+)
+DISHES = (
+    'Stew', 'Curry', 'Salad', 'Soup', 'Pie', 'Tacos', 'Bowl', 'Risotto',
+    'Stir Fry', 'Casserole', 'Pasta', 'Sandwich', 'Skillet', 'Bake',
+)
+
+
+class Command(BaseCommand):
+    """Django command to bulk load a synthetic dataset with COPY"""
+    help = 'Generate deterministic users, tags, ingredients and recipes ' \
+           'with a realistic skew and stream them into PostgreSQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=100000,
+            help='Recipes generated in total across the users'
+        )
+        parser.add_argument(
+            '--tags',
+            type=int,
+            default=200,
+            help='Distinct tag names users draw their tags from'
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=1000,
+            help='Distinct ingredient names users draw their ingredients '
+                 'from'
+        )
+        parser.add_argument(
+            '--pareto-alpha',
+            type=float,
+            default=1.16,
+            help='Shape of the recipe counts per user, 1.16 gives 80% of '
+                 'the recipes to 20% of the users'
+        )
+        parser.add_argument(
+            '--zipf-exponent',
+            type=float,
+            default=1.1,
+            help='Skew of tag and ingredient popularity'
+        )
+        parser.add_argument('--email-prefix', default='dataset-')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        prefix = options['email_prefix']
+        if User.objects.filter(email__startswith=prefix).exists():
+            raise CommandError(
+                f'Users with emails starting with "{prefix}" already '
+                f'exist, delete them or use another --email-prefix'
+            )
+
+        dataset = Dataset(
+            users=options['users'],
+            recipes=options['recipes'],
+            tags=options['tags'],
+            ingredients=options['ingredients'],
+            seed=options['seed'],
+            alpha=options['pareto_alpha'],
+            exponent=options['zipf_exponent'],
+        )
+        started = time.monotonic()
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.load(cursor, dataset, prefix)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(dataset.counts)} users and '
+            f'{sum(dataset.counts)} recipes in '
+            f'{time.monotonic() - started:.1f}s, password "{PASSWORD}"'
+        ))
+
+    def load(self, cursor, dataset, prefix):
+        """Reserve the ids and stream every table of the dataset"""
+        User = get_user_model()
+        # Writers wait for the load, so the reserved ids stay contiguous
+        cursor.execute('LOCK TABLE {} IN SHARE ROW EXCLUSIVE MODE'.format(
+            ', '.join(
+                connection.ops.quote_name(model._meta.db_table)
+                for model in (User, Tag, Ingredient, Recipe)
+            )
+        ))
+
+        users = len(dataset.counts)
+        tag_offsets, ingredient_offsets = dataset.vocabularies()
+        user_start = reserve_ids(cursor, User, users)
+        tag_start = reserve_ids(cursor, Tag, _size(tag_offsets))
+        ingredient_start = reserve_ids(
+            cursor, Ingredient, _size(ingredient_offsets)
+        )
+        recipe_start = reserve_ids(cursor, Recipe, sum(dataset.counts))
+
+        password = make_password(PASSWORD)
+        self.copy(cursor, User, (
+            'id', 'password', 'is_superuser', 'email', 'name', 'is_active',
+            'is_staff'
+        ), (
+            (user_start + index, password, False,
+             f'{prefix}{index}@example.com', f'Dataset user {index}',
+             True, False)
+            for index in range(users)
+        ))
+        modified_at = timezone.now().isoformat()
+        self.copy(cursor, LibraryVersion, (
+            'user_id', 'version', 'modified_at'
+        ), (
+            (user_start + index, 1, modified_at) for index in range(users)
+        ))
+        for model, names, offsets, start in (
+            (Tag, dataset.tag_names, tag_offsets, tag_start),
+            (Ingredient, dataset.ingredient_names, ingredient_offsets,
+             ingredient_start),
+        ):
+            self.copy(cursor, model, ('id', 'name', 'user_id'), (
+                (start + offset, names[rank], user_start + index)
+                for index, ranks in enumerate(offsets)
+                for rank, offset in ranks.items()
+            ))
+
+        self.copy(cursor, Recipe, (
+            'id', 'user_id', 'title', 'time_minutes', 'price', 'link',
+            'image_status'
+        ), (
+            (recipe_id, user_start + index, title, minutes, price, link, '')
+            for recipe_id, index, (title, minutes, price, link, _, _)
+            in dataset.recipes(recipe_start)
+        ))
+        for through, column, position, offsets, start in (
+            (Recipe.tags.through, 'tag_id', 4, tag_offsets, tag_start),
+            (Recipe.ingredients.through, 'ingredient_id', 5,
+             ingredient_offsets, ingredient_start),
+        ):
+            self.copy(cursor, through, ('recipe_id', column), (
+                (recipe_id, start + offsets[index][rank])
+                for recipe_id, index, recipe in dataset.recipes(recipe_start)
+                for rank in recipe[position]
+            ))
+
+        # Plan the search vector joins with statistics of the loaded rows
+        for model in (User, Tag, Ingredient, Recipe, Recipe.tags.through,
+                      Recipe.ingredients.through):
+            cursor.execute(
+                f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}'
+            )
+        recipe_ids = range(recipe_start, recipe_start + sum(dataset.counts))
+        for chunk in range(0, len(recipe_ids), 10000):
+            Recipe.objects.refresh_search_vectors(
+                recipe_ids[chunk:chunk + 10000]
+            )
+
+    def copy(self, cursor, model, columns, rows):
+        """Stream rows into the table of a model with COPY"""
+        started = time.monotonic()
+        stream = RowStream(rows)
+        cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(c) for c in columns)
+        ), stream)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{model._meta.db_table}: {stream.count} rows '
+            f'({stream.count / elapsed if elapsed else 0:.0f} rows/s)'
+        )
+
+
+class Dataset:
+    """Synthetic libraries drawn deterministically from a seed
+
+    The recipes of each user come from a generator seeded with the seed
+    and the user's index, so every COPY stream draws them again instead
+    of holding millions of rows in memory.
+    """
+
+    def __init__(self, users, recipes, tags, ingredients, seed, alpha,
+                 exponent):
+        self.seed = seed
+        self.counts = allocate(recipes, users, alpha, random.Random(seed))
+        self.tag_names = vocabulary(TAG_WORDS, tags)
+        self.ingredient_names = vocabulary(INGREDIENT_WORDS, ingredients)
+        self.tag_weights = zipf_weights(tags, exponent)
+        self.ingredient_weights = zipf_weights(ingredients, exponent)
+
+    def user_recipes(self, index):
+        """Yield the recipes of one user as tuples of
+        (title, minutes, price, link, tag ranks, ingredient ranks)
+        """
+        rng = random.Random(f'{self.seed}:{index}')
+        for number in range(self.counts[index]):
+            tags = draw(rng, self.tag_weights, rng.randint(0, 4))
+            ingredients = draw(
+                rng, self.ingredient_weights, rng.randint(3, 10)
+            )
+            main = self.ingredient_names[rng.choice(ingredients)] \
+                if ingredients else 'House'
+            yield (
+                f'{rng.choice(ADJECTIVES)} {main} {rng.choice(DISHES)}',
+                rng.randint(5, 180),
+                f'{rng.randint(100, 5000) / 100:.2f}',
+                f'https://example.com/recipes/{index}/{number}'
+                if rng.random() < 0.3 else '',
+                tags,
+                ingredients,
+            )
+
+    def recipes(self, start):
+        """Yield (id, user index, recipe) of every recipe from a first id"""
+        recipe_id = start
+        for index in range(len(self.counts)):
+            for recipe in self.user_recipes(index):
+                yield recipe_id, index, recipe
+                recipe_id += 1
+
+    def vocabularies(self):
+        """Return the tags and ingredients each user uses
+
+        Each is a list of {rank: offset} per user, the offset counting the
+        rows of the table across all users.
+        """
+        tags, ingredients = [], []
+        tag_offset = ingredient_offset = 0
+        for index in range(len(self.counts)):
+            tag_ranks, ingredient_ranks = set(), set()
+            for recipe in self.user_recipes(index):
+                tag_ranks.update(recipe[4])
+                ingredient_ranks.update(recipe[5])
+            tags.append({
+                rank: tag_offset + i
+                for i, rank in enumerate(sorted(tag_ranks))
+            })
+            ingredients.append({
+                rank: ingredient_offset + i
+                for i, rank in enumerate(sorted(ingredient_ranks))
+            })
+            tag_offset += len(tag_ranks)
+            ingredient_offset += len(ingredient_ranks)
+
+        return tags, ingredients
+
+
+class RowStream:
+    """File like object reading rows in the COPY text format"""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.count = 0
+        self._buffer = ''
+
+    def read(self, size=-1):
+        lines = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = '\t'.join(_copy_value(value) for value in row) + '\n'
+            lines.append(line)
+            length += len(line)
+            self.count += 1
+
+        data = ''.join(lines)
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def reserve_ids(cursor, model, count):
+    """Take count ids from the sequence of a table, returning the first"""
+    cursor.execute(
+        "SELECT pg_get_serial_sequence(%s, 'id')",
+        [model._meta.db_table]
+    )
+    sequence = cursor.fetchone()[0]
+    cursor.execute('SELECT nextval(%s)', [sequence])
+    first = cursor.fetchone()[0]
+    if count > 1:
+        cursor.execute('SELECT setval(%s, %s)', [sequence, first + count - 1])
+    return first
+
+
+def allocate(total, users, alpha, rng):
+    """Split a total into per user counts following a Pareto distribution"""
+    if users <= 0:
+        return []
+    weights = [rng.paretovariate(alpha) for _ in range(users)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for index in range(total - sum(counts)):
+        counts[index % users] += 1
+    return counts
+
+
+def vocabulary(words, size):
+    """Return size distinct names, numbering the words once they run out"""
+    return [
+        words[i % len(words)] +
+        (f' {i // len(words) + 1}' if i >= len(words) else '')
+        for i in range(size)
+    ]
+
+
+def zipf_weights(size, exponent):
+    """Return the cumulative Zipf weights of ranks 0 to size - 1"""
+    return list(accumulate(
+        1 / (rank + 1) ** exponent for rank in range(size)
+    ))
+
+
+def draw(rng, cum_weights, k):
+    """Return up to k distinct ranks drawn by popularity"""
+    if not cum_weights:
+        return []
+    return sorted(set(
+        rng.choices(range(len(cum_weights)), cum_weights=cum_weights, k=k)
+    ))
+
+
+def _size(offsets):
+    return sum(len(ranks) for ranks in offsets)
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t') \
+        .replace('\n', '\\n').replace('\r', '\\r')
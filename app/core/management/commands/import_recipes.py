@@ -0,0 +1,163 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Tag, Ingredient, LibraryVersion
+from recipe import bulk
+
+
+class Command(BaseCommand):
+    """Django command to stream a recipe file into a user's library"""
+    help = 'Import recipes from a JSONL or CSV file for a user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the importing user')
+        parser.add_argument('path', help='JSONL or CSV file of recipes')
+        parser.add_argument(
+            '--format',
+            choices=('jsonl', 'csv'),
+            help='File format, guessed from the file extension if omitted'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes inserted per transaction'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User "{options["email"]}" does not exist')
+
+        file_format = options['format'] or \
+            ('csv' if options['path'].endswith('.csv') else 'jsonl')
+        batch_size = options['batch_size']
+        names = {
+            'tags': NameResolver(Tag, user),
+            'ingredients': NameResolver(Ingredient, user),
+        }
+
+        imported = skipped = 0
+        started = time.monotonic()
+        with open(options['path'], newline='', encoding='utf-8') as f:
+            rows = read_csv(f) if file_format == 'csv' else read_jsonl(f)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+
+                items = []
+                for line, row in batch:
+                    try:
+                        if isinstance(row, str):
+                            row = json.loads(row)
+                        items.append(to_item(row))
+                    except (KeyError, TypeError, ValueError,
+                            InvalidOperation) as e:
+                        skipped += 1
+                        self.stderr.write(f'Skipping line {line}: {e!r}')
+
+                for name, resolver in names.items():
+                    resolver.resolve(items, name)
+                bulk.create_recipes(user, items, batch_size)
+
+                imported += len(items)
+                self.stdout.write(
+                    f'{imported} recipes imported '
+                    f'({rate(imported, started):.0f} rows/s)'
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes, skipped {skipped}, '
+            f'{rate(imported, started):.0f} rows/s'
+        ))
+
+
+class NameResolver:
+    """Map tag or ingredient names to ids, creating missing rows in bulk"""
+
+    def __init__(self, model, user):
+        self.model = model
+        self.user = user
+        self.ids = {}
+
+    def resolve(self, items, field):
+        """Replace the names in each item's field with ids"""
+        wanted = {
+            name for item in items for name in item.get(field, ())
+        } - self.ids.keys()
+        if wanted:
+            existing = self.model.objects.filter(
+                user=self.user,
+                name__in=wanted
+            ).order_by('-id').values_list('name', 'id')
+            self.ids.update(existing)
+
+            created = self.model.objects.bulk_create([
+                self.model(user=self.user, name=name)
+                for name in wanted - self.ids.keys()
+            ])
+            self.ids.update((obj.name, obj.id) for obj in created)
+            if created:
+                LibraryVersion.objects.bump(self.user.id)
+
+        for item in items:
+            if field in item:
+                item[field] = [self.ids[name] for name in item[field]]
+
+
+def read_jsonl(f):
+    """Yield (line number, text) for each non blank line of a JSONL file"""
+    for line, text in enumerate(f, start=1):
+        if text.strip():
+            yield line, text
+
+
+def read_csv(f):
+    """Yield (line number, row) for a CSV file with a header row
+
+    Tags and ingredients are given as names separated by ``|``.
+    """
+    for line, row in enumerate(csv.DictReader(f), start=2):
+        for field in ('tags', 'ingredients'):
+            value = row.get(field)
+            row[field] = [n for n in value.split('|') if n] if value else []
+        yield line, row
+
+
+def to_item(row):
+    """Convert a file row into the fields of a recipe"""
+    price = Decimal(str(row['price'])).quantize(Decimal('0.01'))
+    if abs(price) >= 1000:
+        raise ValueError(f'price {price} out of range')
+    time_minutes = int(row['time_minutes'])
+    if not -2 ** 31 <= time_minutes < 2 ** 31:
+        raise ValueError(f'time_minutes {time_minutes} out of range')
+
+    item = {
+        'title': str(row['title'])[:255],
+        'time_minutes': time_minutes,
+        'price': price,
+        'link': str(row.get('link') or '')[:255],
+    }
+    for field in ('tags', 'ingredients'):
+        names = row.get(field) or []
+        if isinstance(names, str):
+            raise ValueError(f'{field} must be a list of names')
+        item[field] = [
+            str(name).strip()[:255] for name in names if str(name).strip()
+        ]
+
+    return item
+
+
+def rate(count, started):
+    """Return the count per second since started"""
+    return count / max(time.monotonic() - started, 1e-6)
@@ -0,0 +1,12 @@
+from django.contrib.staticfiles.management.commands import runserver
+from django.db import connections
+
+
+class Command(runserver.Command):
+    """Development server releasing the connections of its startup checks"""
+
+    def check_migrations(self):
+        super().check_migrations()
+        # The main thread serves no requests, so its connections would
+        # otherwise hold a slot of the connection pool for good
+        connections.close_all()
@@ -0,0 +1,237 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from rest_framework.serializers import ListSerializer
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# (key in a sample, metric name, type, help) of each exposed metric
+METRICS = (
+    ('requests', 'http_requests_total', 'counter',
+     'Requests by route, method and status'),
+    ('duration', 'http_request_duration_seconds', 'histogram',
+     'Request latency in seconds'),
+    ('queries', 'http_request_db_queries', 'summary',
+     'Database queries per request'),
+    ('db_time', 'http_request_db_seconds', 'summary',
+     'Time spent in database queries per request'),
+    ('serialize_time', 'http_response_serialize_seconds', 'summary',
+     'Time spent serializing the response data'),
+    ('render_time', 'http_response_render_seconds', 'summary',
+     'Time spent rendering the response body'),
+    ('size', 'http_response_size_bytes', 'summary',
+     'Response body size in bytes'),
+)
+
+
+class Registry:
+    """Thread safe per route request metrics of one process
+
+    With a directory configured the metrics are also written there as a
+    snapshot per process, so any worker can expose the total of all of
+    them.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._flushed = 0
+
+    def observe(self, route, method, status, duration, queries, db_time,
+                render_time, size, serialize_time=None):
+        """Record one request"""
+        with self._lock:
+            sample = self._samples.get((route, method))
+            if sample is None:
+                sample = self._samples[(route, method)] = _new_sample()
+
+            sample['requests'][str(status)] = \
+                sample['requests'].get(str(status), 0) + 1
+            sample['buckets'][bisect_left(BUCKETS, duration)] += 1
+            for name, value in (('duration', duration),
+                                ('queries', queries),
+                                ('db_time', db_time),
+                                ('serialize_time', serialize_time),
+                                ('render_time', render_time),
+                                ('size', size)):
+                if value is not None:
+                    sample[name][0] += 1
+                    sample[name][1] += value
+
+            flush = self.directory and \
+                time.monotonic() - self._flushed >= self.flush_interval
+
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        """Return a copy of the samples as (route, method, sample) rows"""
+        with self._lock:
+            return [
+                [route, method, json.loads(json.dumps(sample))]
+                for (route, method), sample in self._samples.items()
+            ]
+
+    def flush(self):
+        """Write the snapshot of this process to the metrics directory"""
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._flushed = time.monotonic()
+
+    def collect(self):
+        """Return the samples of every process merged by route"""
+        rows = self.snapshot()
+        if self.directory:
+            own = os.path.join(self.directory, f'{os.getpid()}.json')
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        rows.extend(json.load(f))
+                except (OSError, ValueError):
+                    continue
+
+        merged = {}
+        for route, method, sample in rows:
+            total = merged.get((route, method))
+            if total is None:
+                merged[(route, method)] = sample
+                continue
+            for status, count in sample['requests'].items():
+                total['requests'][status] = \
+                    total['requests'].get(status, 0) + count
+            total['buckets'] = [
+                a + b for a, b in zip(total['buckets'], sample['buckets'])
+            ]
+            for name in ('duration', 'queries', 'db_time', 'serialize_time',
+                         'render_time', 'size'):
+                total[name] = [
+                    a + b for a, b in zip(total[name], sample[name])
+                ]
+
+        return merged
+
+    def render(self):
+        """Return the merged metrics in the Prometheus text format"""
+        merged = sorted(self.collect().items())
+        lines = []
+        for key, name, kind, help_text in METRICS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (route, method), sample in merged:
+                labels = f'route="{_escape(route)}",method="{method}"'
+                if key == 'requests':
+                    for status, count in sorted(sample['requests'].items()):
+                        lines.append(
+                            f'{name}{{{labels},status="{status}"}} {count}'
+                        )
+                    continue
+
+                count, total = sample[key]
+                if kind == 'histogram':
+                    cumulative = 0
+                    for bound, observed in zip(BUCKETS + ('+Inf',),
+                                               sample['buckets']):
+                        cumulative += observed
+                        lines.append(
+                            f'{name}_bucket{{{labels},le="{bound}"}} '
+                            f'{cumulative}'
+                        )
+                lines.append(f'{name}_count{{{labels}}} {count}')
+                lines.append(f'{name}_sum{{{labels}}} {total}')
+
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        """Drop every sample of this process"""
+        with self._lock:
+            self._samples.clear()
+
+
+class QueryTimer:
+    """Database execute wrapper counting and timing queries"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class SerializeTimeMixin:
+    """Add the time a serializer takes to produce its data to the request
+
+    Only the serializer whose data is read is timed, which includes its
+    nested and list child serializers and the queries they run.
+    """
+
+    @property
+    def data(self):
+        if hasattr(self, '_data'):
+            return super().data
+
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            add_serialize_time(
+                self.context.get('request'),
+                time.perf_counter() - started
+            )
+
+
+class TimedListSerializer(SerializeTimeMixin, ListSerializer):
+    """List serializer timing its data for the request metrics"""
+
+
+def add_serialize_time(request, seconds):
+    """Add to the time spent serializing the data of a request"""
+    if request is None:
+        return
+    # The middleware sees the Django request a REST framework one wraps
+    request = getattr(request, '_request', request)
+    request._metrics_serialize_time = \
+        getattr(request, '_metrics_serialize_time', 0) + seconds
+
+
+registry = Registry(
+    directory=settings.METRICS['DIRECTORY'],
+    flush_interval=settings.METRICS['FLUSH_INTERVAL'],
+)
+
+
+def _new_sample():
+    return {
+        'requests': {},
+        'buckets': [0] * (len(BUCKETS) + 1),
+        'duration': [0, 0.0],
+        'queries': [0, 0],
+        'db_time': [0, 0.0],
+        'serialize_time': [0, 0.0],
+        'render_time': [0, 0.0],
+        'size': [0, 0],
+    }
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
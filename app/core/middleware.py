@@ -0,0 +1,117 @@
+import time
+from contextlib import ExitStack
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse, JsonResponse
+
+from core import metrics
+
+
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+
+class HealthCheckMiddleware:
+    """Answer the /healthz and /readyz probes ahead of other middleware
+
+    Liveness only shows the process serves requests. Readiness makes a
+    database round trip and checks every migration is applied, which is
+    remembered once true since migrations are not unapplied at runtime.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.migrated = False
+
+    def __call__(self, request):
+        path = request.path.rstrip('/')
+        if path == '/healthz':
+            return self._response({'status': 'ok'})
+        elif path == '/readyz':
+            return self.readiness()
+
+        return self.get_response(request)
+
+    def readiness(self):
+        """Check the database answers and its schema is up to date"""
+        connection = connections[DEFAULT_DB_ALIAS]
+        started = time.perf_counter()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            latency = (time.perf_counter() - started) * 1000
+            if not self.migrated:
+                executor = MigrationExecutor(connection)
+                self.migrated = not executor.migration_plan(
+                    executor.loader.graph.leaf_nodes()
+                )
+        except DatabaseError as e:
+            return self._response(
+                {'status': 'unavailable', 'database': str(e)},
+                status=503
+            )
+
+        data = {
+            'status': 'ok' if self.migrated else 'unavailable',
+            'database': {'latency_ms': round(latency, 3)},
+            'migrations': 'applied' if self.migrated else 'pending',
+        }
+        if hasattr(connection, 'pool_stats'):
+            data['database']['pool'] = connection.pool_stats()
+        return self._response(data, status=200 if self.migrated else 503)
+
+    def _response(self, data, status=200):
+        response = JsonResponse(data, status=status)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class MetricsMiddleware:
+    """Record per route metrics of each request and serve them at /metrics
+
+    Routes are labelled by view name, and the database queries of all
+    connections are counted and timed while the request is handled.
+    Serialization is timed by serializers using SerializeTimeMixin and
+    rendering by the post render callback of the response.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path == '/metrics':
+            return HttpResponse(
+                metrics.registry.render(),
+                content_type='text/plain; version=0.0.4; charset=utf-8'
+            )
+
+        queries = metrics.QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        metrics.registry.observe(
+            route=match.view_name if match else 'unresolved',
+            method=request.method if request.method in METHODS else 'other',
+            status=response.status_code,
+            duration=duration,
+            queries=queries.count,
+            db_time=queries.duration,
+            render_time=getattr(request, '_metrics_render_time', None),
+            size=None if response.streaming else len(response.content),
+            serialize_time=getattr(request, '_metrics_serialize_time', None),
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._metrics_render_time = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,35 @@
+# Generated by Django 2.1.15 on 2026-10-18 16:18
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def refresh_search_vectors(apps, schema_editor):
+    # The manager holds the one definition of the search document and
+    # its RECIPE_SEARCH_CONFIG, historical models lack its methods
+    from core.models import Recipe
+    Recipe.objects.refresh_search_vectors()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_libraryversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_recipe_search__c01407_gin'),
+        ),
+        migrations.RunPython(
+            refresh_search_vectors,
+            migrations.RunPython.noop,
+        ),
+    ]
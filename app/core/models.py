@@ -1,6 +1,12 @@
+import hashlib
 import os
+import threading
 import uuid
-from django.db import models
+from contextlib import contextmanager
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models
 from django.contrib.auth.models import AbstractBaseUser, \
     BaseUserManager, PermissionsMixin
 from django.conf import settings
@@ -9,9 +15,33 @@ from django.conf import settings
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image"""
     ext = filename.split('.')[-1]
-    filename = f'{uuid.uuid4()}.{ext}'
+    digest = None
+    if settings.RECIPE_IMAGE_STORAGE == 'content':
+        digest = _content_digest(instance.image)
+    if digest is None:
+        filename = f'{uuid.uuid4()}.{ext}'
+        return os.path.join('uploads/recipe/', filename)
+
+    filename = f'{digest}.{ext.lower()}'
+    return os.path.join('uploads/recipe/', digest[:2], digest[2:4], filename)
+
 
-    return os.path.join('uploads/recipe/', filename)
+def _content_digest(field_file):
+    """Return the SHA-256 of a file being saved, None if it is not new"""
+    if field_file._committed:
+        return None
+
+    content = field_file.file
+    digest = getattr(content, 'sha256', None)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        content.seek(0)
+        digest = sha256.hexdigest()
+
+    return digest
 
 
 class UserManager(BaseUserManager):
@@ -59,6 +89,14 @@ class Tag(models.Model):
         on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name', 'id'],
+                name='core_tag_user_name_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -71,12 +109,85 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name', 'id'],
+                name='core_ingredient_user_name_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class RecipeManager(models.Manager):
+    _batch = threading.local()
+
+    def refresh_search_vectors(self, recipe_ids=None):
+        """Rebuild the search document of recipes from their relations
+
+        Titles weigh more than tag and ingredient names, which weigh more
+        than the link. All recipes are refreshed when no ids are given.
+        """
+        if recipe_ids is not None and not recipe_ids:
+            return
+        pending = getattr(self._batch, 'recipe_ids', None)
+        if recipe_ids is not None and pending is not None:
+            pending.update(recipe_ids)
+            return
+
+        config = settings.RECIPE_SEARCH_CONFIG
+        sql = f"""
+            UPDATE core_recipe r SET search_vector =
+                setweight(to_tsvector(%s, r.title), 'A') ||
+                setweight(to_tsvector(%s, coalesce((
+                    SELECT string_agg(t.name, ' ')
+                    FROM core_recipe_tags rt
+                    JOIN core_tag t ON t.id = rt.tag_id
+                    WHERE rt.recipe_id = r.id
+                ), '')), 'B') ||
+                setweight(to_tsvector(%s, coalesce((
+                    SELECT string_agg(i.name, ' ')
+                    FROM core_recipe_ingredients ri
+                    JOIN core_ingredient i ON i.id = ri.ingredient_id
+                    WHERE ri.recipe_id = r.id
+                ), '')), 'B') ||
+                setweight(to_tsvector('simple', r.link), 'C')
+            {'' if recipe_ids is None else 'WHERE r.id = ANY(%s)'}
+        """
+        params = [config, config, config]
+        if recipe_ids is not None:
+            params.append(list(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    @contextmanager
+    def batch(self):
+        """Refresh each changed search document once when the block exits"""
+        if getattr(self._batch, 'recipe_ids', None) is not None:
+            yield
+            return
+
+        self._batch.recipe_ids = set()
+        try:
+            yield
+        finally:
+            recipe_ids, self._batch.recipe_ids = self._batch.recipe_ids, None
+        self.refresh_search_vectors(recipe_ids)
+
+
 class Recipe(models.Model):
     """Recipe object"""
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
@@ -88,6 +199,138 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image_thumbnail = models.ImageField(null=True, editable=False)
+    image_medium = models.ImageField(null=True, editable=False)
+    image_webp = models.ImageField(null=True, editable=False)
+    image_status = models.CharField(
+        max_length=16,
+        choices=IMAGE_STATUS_CHOICES,
+        blank=True
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector']),
+            models.Index(
+                fields=['user', 'id'],
+                name='core_recipe_user_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class LibraryVersionManager(models.Manager):
+    _batch = threading.local()
+
+    def bump(self, user_id):
+        """Increment the version of a user's library"""
+        if user_id in getattr(self._batch, 'deleting', ()):
+            return
+        pending = getattr(self._batch, 'user_ids', None)
+        if pending is not None:
+            pending.add(user_id)
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                f'(user_id, version, modified_at) VALUES (%s, 1, now()) '
+                f'ON CONFLICT (user_id) DO UPDATE SET '
+                f'version = EXCLUDED.version + '
+                f'{self.model._meta.db_table}.version, '
+                f'modified_at = EXCLUDED.modified_at',
+                [user_id]
+            )
+
+    @contextmanager
+    def batch(self):
+        """Bump each changed library once when the block exits"""
+        if getattr(self._batch, 'user_ids', None) is not None:
+            yield
+            return
+
+        self._batch.user_ids = set()
+        try:
+            yield
+        finally:
+            user_ids, self._batch.user_ids = self._batch.user_ids, None
+        for user_id in user_ids:
+            self.bump(user_id)
+
+    def suspend(self, user_id):
+        """Stop bumping the library of a user that is being deleted"""
+        if not hasattr(self._batch, 'deleting'):
+            self._batch.deleting = set()
+        self._batch.deleting.add(user_id)
+
+    def resume(self, user_id):
+        """Bump the library of the user again"""
+        getattr(self._batch, 'deleting', set()).discard(user_id)
+
+    def for_user(self, user):
+        """Return the library version of a user, unsaved if never changed"""
+        version = self.filter(user=user).first()
+        return version or self.model(user=user, version=0)
+
+
+class LibraryVersion(models.Model):
+    """Version of a user's recipes, tags and ingredients
+
+    Bumped on every write so conditional requests can be answered without
+    querying the library itself.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    version = models.BigIntegerField(default=0)
+    modified_at = models.DateTimeField(null=True)
+
+    objects = LibraryVersionManager()
+
+
+class ImageBlobManager(models.Manager):
+
+    def acquire(self, name):
+        """Count a new reference to a stored image"""
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (name, refcount) VALUES (%s, 1) '
+                f'ON CONFLICT (name) DO UPDATE SET '
+                f'refcount = {table}.refcount + 1',
+                [name]
+            )
+
+    def release(self, name):
+        """Drop a reference to an image, True if it was the last one"""
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET refcount = refcount - 1 '
+                f'WHERE name = %s RETURNING refcount',
+                [name]
+            )
+            row = cursor.fetchone()
+            if row is None or row[0] > 0:
+                return False
+
+            cursor.execute(
+                f'DELETE FROM {table} WHERE name = %s AND refcount <= 0',
+                [name]
+            )
+            return cursor.rowcount > 0
+
+
+class ImageBlob(models.Model):
+    """Reference count of a content addressed image file"""
+    name = models.CharField(max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField(default=0)
+
+    objects = ImageBlobManager()
@@ -0,0 +1,121 @@
+import logging
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# Transaction control statements, which tests add around every atomic block
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more queries than its budget allows"""
+
+
+class QueryRecorder:
+    """Database execute wrapper keeping the SQL and stack of each query"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            self.queries.append((sql, traceback.extract_stack()[:-1]))
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMixin:
+    """Hold each action of a view to a budget of queries
+
+    query_budgets maps an action, or the lower case method of views
+    without actions, to its (max queries, max duplicates). A duplicate is
+    a query whose SQL ran earlier in the request with any parameters, the
+    signature of an N+1 query. With QUERY_BUDGET_MODE set to 'log' or
+    'raise' a request over budget is logged or fails with the offending
+    SQL and its stack.
+    """
+    query_budgets = {}
+    default_query_budget = (10, 0)
+
+    def dispatch(self, request, *args, **kwargs):
+        mode = settings.QUERY_BUDGET_MODE
+        if mode == 'off':
+            return super().dispatch(request, *args, **kwargs)
+
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = super().dispatch(request, *args, **kwargs)
+
+        action = getattr(self, 'action', None) or request.method.lower()
+        max_queries, max_duplicates = self.query_budgets.get(
+            action,
+            self.default_query_budget
+        )
+        index = over_budget(recorder.queries, max_queries, max_duplicates)
+        if index is not None:
+            message = report(
+                f'{type(self).__name__}.{action}',
+                recorder.queries,
+                index,
+                max_queries,
+                max_duplicates
+            )
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
+
+
+def over_budget(queries, max_queries, max_duplicates):
+    """Return the index of the first query over budget, or None"""
+    seen = set()
+    duplicates = 0
+    for index, (sql, _) in enumerate(queries):
+        if index >= max_queries:
+            return index
+        if sql in seen:
+            duplicates += 1
+            if duplicates > max_duplicates:
+                return index
+        seen.add(sql)
+
+    return None
+
+
+def report(name, queries, index, max_queries, max_duplicates):
+    """Describe the queries of a request and where the offending one ran"""
+    counts = {}
+    for sql, _ in queries:
+        counts[sql] = counts.get(sql, 0) + 1
+    duplicates = sum(count - 1 for count in counts.values())
+
+    lines = [
+        f'{name} ran {len(queries)} queries (budget {max_queries}) with '
+        f'{duplicates} duplicates (budget {max_duplicates}).'
+    ]
+    for number, (sql, _) in enumerate(queries):
+        marker = '>' if number == index else ' '
+        lines.append(f'{marker} {number + 1}. {sql}')
+    sql, stack = queries[index]
+    lines.append(f'Query {index + 1} ran {counts[sql]} times, first over '
+                 f'budget at:')
+    lines.append(''.join(traceback.format_list(_own_frames(stack))).rstrip())
+    return '\n'.join(lines)
+
+
+def _own_frames(stack):
+    """Return the frames of the project's code, or all when it has none"""
+    frames = [
+        frame for frame in stack
+        if frame.filename.startswith(settings.BASE_DIR) and
+        'site-packages' not in frame.filename and
+        frame.filename != __file__
+    ]
+    return frames or stack
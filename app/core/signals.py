@@ -0,0 +1,83 @@
+from core import images
+from core.models import Tag, Recipe, LibraryVersion
+
+
+def bump_library_version(sender, instance, **kwargs):
+    """Bump the library version of the owner of a saved or deleted object"""
+    LibraryVersion.objects.bump(instance.user_id)
+
+
+def bump_library_version_m2m(sender, instance, action, **kwargs):
+    """Bump the library version when recipe tags or ingredients change"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        LibraryVersion.objects.bump(instance.user_id)
+
+
+def suspend_library_version(sender, instance, **kwargs):
+    """Skip bumps from the cascade deleting a user's library"""
+    LibraryVersion.objects.suspend(instance.pk)
+
+
+def resume_library_version(sender, instance, **kwargs):
+    LibraryVersion.objects.resume(instance.pk)
+
+
+def refresh_recipe_search(sender, instance, update_fields=None, **kwargs):
+    """Rebuild the search document of a saved recipe"""
+    if update_fields is None or {'title', 'link'} & set(update_fields):
+        Recipe.objects.refresh_search_vectors([instance.pk])
+
+
+def refresh_recipe_search_m2m(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    """Rebuild the search documents of recipes whose relations changed"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Recipe.objects.refresh_search_vectors([instance.pk])
+    elif action == 'pre_clear':
+        instance._search_recipe_ids = _linked_recipe_ids(sender, instance)
+    elif action == 'post_clear':
+        Recipe.objects.refresh_search_vectors(instance._search_recipe_ids)
+    elif action in ('post_add', 'post_remove'):
+        Recipe.objects.refresh_search_vectors(pk_set)
+
+
+def refresh_linked_recipe_search(sender, instance, created=False, **kwargs):
+    """Rebuild the search documents of recipes using a renamed tag"""
+    if not created:
+        through = _through_for(sender)
+        Recipe.objects.refresh_search_vectors(
+            _linked_recipe_ids(through, instance)
+        )
+
+
+def collect_linked_recipes(sender, instance, **kwargs):
+    """Remember the recipes of a tag or ingredient about to be deleted"""
+    through = _through_for(sender)
+    instance._search_recipe_ids = _linked_recipe_ids(through, instance)
+
+
+def refresh_unlinked_recipe_search(sender, instance, **kwargs):
+    """Rebuild the search documents of recipes of a deleted tag"""
+    Recipe.objects.refresh_search_vectors(instance._search_recipe_ids)
+
+
+def _through_for(model):
+    """Return the recipe through model of the Tag or Ingredient model"""
+    if model is Tag:
+        return Recipe.tags.through
+    return Recipe.ingredients.through
+
+
+def _linked_recipe_ids(through, instance):
+    column = f'{instance._meta.model_name}_id'
+    return list(
+        through.objects.filter(**{column: instance.pk})
+        .values_list('recipe_id', flat=True)
+    )
+
+
+def release_recipe_image(sender, instance, **kwargs):
+    """Drop the reference of a deleted recipe to its image"""
+    if instance.image:
+        images.release(instance.image.name, instance.image.storage)
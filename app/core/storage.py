@@ -0,0 +1,25 @@
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage for files named by their content
+
+    A name that is already stored holds the same content, so saving it
+    again keeps the existing file instead of writing another copy.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+
+        # Write under a unique name first so concurrent saves of the same
+        # content never expose a partially written file
+        temp_name = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
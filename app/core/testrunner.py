@@ -0,0 +1,22 @@
+import os
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Run the tests with the query budgets of the API views enforced
+
+    A request over its budget fails the test unless QUERY_BUDGET_MODE is
+    set in the environment.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._query_budget_mode = settings.QUERY_BUDGET_MODE
+        if 'QUERY_BUDGET_MODE' not in os.environ:
+            settings.QUERY_BUDGET_MODE = 'raise'
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_BUDGET_MODE = self._query_budget_mode
+        super().teardown_test_environment(**kwargs)
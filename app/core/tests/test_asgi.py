@@ -0,0 +1,208 @@
+import asyncio
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase, \
+    override_settings
+
+from rest_framework.authtoken.models import Token
+
+from core.asgi import ASGIHandler, build_environ
+from core.models import Recipe
+from recipe.uploadhandlers import MULTIPART_OVERHEAD
+
+
+def call(app, scope, messages):
+    """Run one ASGI connection, returning the messages sent by the app"""
+    messages = list(messages)
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(app(scope, receive, send))
+    finally:
+        loop.close()
+    return sent
+
+
+def http_scope(method, path, headers=(), query_string=b''):
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'query_string': query_string,
+        'headers': [(b'host', b'testserver')] + list(headers),
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+
+
+def response(sent):
+    """Return the status, headers and body of the sent messages"""
+    start = sent[0]
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return start['status'], dict(start['headers']), body
+
+
+class ASGIHandlerTests(TransactionTestCase):
+    """Serve requests through the ASGI application"""
+
+    def setUp(self):
+        self.app = ASGIHandler(max_workers=2)
+        self.addCleanup(self.app.executor.shutdown)
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = (b'authorization', f'Token {self.token.key}'.encode())
+
+    def _recipes(self, count):
+        for i in range(count):
+            Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=1.00
+            )
+
+    def test_get(self):
+        """Test a read request is answered in one body message"""
+        self._recipes(3)
+
+        sent = call(
+            self.app,
+            http_scope('GET', '/api/recipe/recipes/', [self.auth]),
+            [{'type': 'http.request', 'body': b''}]
+        )
+
+        status, headers, body = response(sent)
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'content-type'], b'application/json')
+        self.assertEqual(len(json.loads(body)['results']), 3)
+        self.assertEqual(len(sent), 2)
+
+    def test_post_body_in_chunks(self):
+        """Test a request body received in several messages is read"""
+        payload = json.dumps({
+            'email': 'new@test.com',
+            'password': 'testpass',
+            'name': 'New',
+        }).encode()
+        scope = http_scope('POST', '/api/user/create/', [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode()),
+        ])
+
+        sent = call(self.app, scope, [
+            {'type': 'http.request', 'body': payload[:10], 'more_body': True},
+            {'type': 'http.request', 'body': payload[10:]},
+        ])
+
+        self.assertEqual(response(sent)[0], 201)
+        self.assertTrue(
+            get_user_model().objects.filter(email='new@test.com').exists()
+        )
+
+    def test_streaming_response(self):
+        """Test a streaming response is sent in chunks as it is produced"""
+        self._recipes(3)
+
+        sent = call(
+            self.app,
+            http_scope('GET', '/api/recipe/recipes/export/', [self.auth]),
+            [{'type': 'http.request', 'body': b''}]
+        )
+
+        status, _, body = response(sent)
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body.splitlines()), 3)
+        self.assertTrue(sent[1]['more_body'])
+        self.assertFalse(sent[-1].get('more_body', False))
+
+    def test_content_length_too_large(self):
+        """Test a body declared over the limit is rejected unread"""
+        app = ASGIHandler(max_workers=1, max_body_size=100)
+        scope = http_scope('POST', '/api/user/create/', [
+            (b'content-type', b'application/json'),
+            (b'content-length', b'101'),
+        ])
+
+        sent = call(app, scope, [])
+
+        self.assertEqual(response(sent)[0], 413)
+        self.assertIsNone(app._executor)
+
+    def test_streamed_body_too_large(self):
+        """Test reading stops at the chunk that crosses the limit"""
+        app = ASGIHandler(max_workers=1, max_body_size=100)
+        messages = [
+            {'type': 'http.request', 'body': b'x' * 60, 'more_body': True},
+            {'type': 'http.request', 'body': b'x' * 60, 'more_body': True},
+            {'type': 'http.request', 'body': b'x' * 60},
+        ]
+
+        sent = call(app, http_scope('POST', '/api/user/create/'), messages)
+
+        status, headers, body = response(sent)
+        self.assertEqual(status, 413)
+        self.assertEqual(json.loads(body)['detail'],
+                         'Request body is too large.')
+        self.assertIsNone(app._executor)
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=1024,
+                       DATA_UPLOAD_MAX_MEMORY_SIZE=512)
+    def test_default_max_body_size(self):
+        """Test the limit fits an image upload with its multipart framing"""
+        app = ASGIHandler(max_workers=1)
+
+        self.assertEqual(app.max_body_size, 1024 + MULTIPART_OVERHEAD)
+
+    def test_disconnect_before_body(self):
+        """Test nothing is handled for a client that went away"""
+        sent = call(
+            self.app,
+            http_scope('POST', '/api/user/create/'),
+            [{'type': 'http.disconnect'}]
+        )
+
+        self.assertEqual(sent, [])
+
+    def test_lifespan(self):
+        """Test the server startup and shutdown are acknowledged"""
+        sent = call(self.app, {'type': 'lifespan'}, [
+            {'type': 'lifespan.startup'},
+            {'type': 'lifespan.shutdown'},
+        ])
+
+        self.assertEqual([message['type'] for message in sent], [
+            'lifespan.startup.complete',
+            'lifespan.shutdown.complete',
+        ])
+
+
+class BuildEnvironTests(SimpleTestCase):
+
+    def test_headers(self):
+        """Test headers are mapped to WSGI keys and repeats are joined"""
+        environ = build_environ(http_scope('GET', '/café/', [
+            (b'content-type', b'text/plain'),
+            (b'x-forwarded-for', b'10.0.0.1'),
+            (b'x-forwarded-for', b'10.0.0.2'),
+            (b'cookie', b'a=1'),
+            (b'cookie', b'b=2'),
+        ], query_string=b'tags=1,2'), None)
+
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_X_FORWARDED_FOR'], '10.0.0.1,10.0.0.2')
+        self.assertEqual(environ['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(environ['QUERY_STRING'], 'tags=1,2')
+        self.assertEqual(environ['PATH_INFO'], '/caf\xc3\xa9/')
@@ -1,24 +1,244 @@
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, get_commands
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.management.commands import runserver
+from core.models import Tag, Ingredient, Recipe
+
+
+ENSURE_CONNECTION = \
+    'django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection'
 
 
 class CommandTests(TestCase):
     def test_wait_for_db_ready(self):
         """Test waiting for db when db is available"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
+        with patch(ENSURE_CONNECTION) as ec:
+            call_command('wait_for_db', stdout=StringIO())
 
-            self.assertEqual(gi.call_count, 1)
+            self.assertEqual(ec.call_count, 1)
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
-        """Test waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
+        """Test waiting for db with an exponential backoff"""
+        with patch(ENSURE_CONNECTION) as ec:
+            ec.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', stdout=StringIO())
+
+            self.assertEqual(ec.call_count, 6)
+        delays = [call[0][0] for call in ts.call_args_list]
+        self.assertEqual(delays, [0.1, 0.2, 0.4, 0.8, 1.6])
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """Test waiting for db gives up after the timeout"""
+        with patch(ENSURE_CONNECTION, side_effect=OperationalError):
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', '--timeout', '0',
+                             stdout=StringIO())
+
+    def test_runserver_releases_startup_connections(self):
+        """Test runserver closes the connections of its migration check"""
+        self.assertEqual(get_commands()['runserver'], 'core')
+        command = runserver.Command(stdout=StringIO())
+
+        with patch.object(runserver.connections, 'close_all') as close_all:
+            command.check_migrations()
+
+            close_all.assert_called_once_with()
+
+
+class ImportRecipesCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+
+    def _write(self, suffix, text):
+        """Write text to a temporary file removed after the test"""
+        f = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False)
+        self.addCleanup(os.remove, f.name)
+        with f:
+            f.write(text)
+        return f.name
+
+    def test_import_jsonl(self):
+        """Test importing recipes from JSONL resolves names in batches"""
+        Tag.objects.create(user=self.user, name='Dinner')
+        rows = [
+            {'title': f'Recipe {i}', 'time_minutes': 10, 'price': '4.50',
+             'tags': ['Dinner', 'Quick'], 'ingredients': ['Salt']}
+            for i in range(5)
+        ]
+        path = self._write(
+            '.jsonl',
+            '\n'.join(json.dumps(row) for row in rows) + '\n{not json\n'
+        )
+
+        out = StringIO()
+        err = StringIO()
+        call_command('import_recipes', 'test@test.com', path,
+                     batch_size=2, stdout=out, stderr=err)
+
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 5)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Ingredient.objects.count(), 1)
+        for recipe in recipes:
+            self.assertEqual(
+                sorted(t.name for t in recipe.tags.all()),
+                ['Dinner', 'Quick']
+            )
+        self.assertIn('rows/s', out.getvalue())
+        self.assertIn('line 6', err.getvalue())
+
+    def test_import_csv_skips_bad_rows(self):
+        """Test importing a CSV file skips rows that cannot be parsed"""
+        path = self._write('.csv', (
+            'title,time_minutes,price,link,tags,ingredients\n'
+            'Pancakes,10,2.00,,Breakfast|Sweet,Flour|Eggs\n'
+            'Broken,soon,2.00,,,\n'
+            'Forever,2147483648,2.00,,,\n'
+        ))
+
+        err = StringIO()
+        call_command('import_recipes', 'test@test.com', path,
+                     stdout=StringIO(), stderr=err)
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.title, 'Pancakes')
+        self.assertEqual(recipe.ingredients.count(), 2)
+        self.assertIn('line 3', err.getvalue())
+        self.assertIn('line 4', err.getvalue())
+
+    def test_import_unknown_user(self):
+        """Test importing for a missing user fails"""
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', 'nobody@test.com', 'x.jsonl')
+
+
+class BenchmarkHashersCommandTests(TestCase):
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_reports_hash_rate(self):
+        """Test the hash rate of each configured hasher is reported"""
+        out = StringIO()
+        call_command('benchmark_hashers', '--duration', '0.05', stdout=out)
+
+        self.assertIn('md5: ', out.getvalue())
+        self.assertIn('hashes/s per process', out.getvalue())
+
+    def test_unknown_hasher(self):
+        """Test measuring a hasher that is not configured fails"""
+        with self.assertRaises(CommandError):
+            call_command('benchmark_hashers', '--hasher', 'nope')
+
+
+@override_settings(ALLOWED_HOSTS=['127.0.0.1'], RECIPE_IMAGE_WORKERS=0)
+class BenchmarkCommandTests(TransactionTestCase):
+    """Run the benchmark against a server reading committed data"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def test_reports_every_scenario(self):
+        """Test each endpoint is driven without errors and summarized"""
+        existing = get_user_model().objects.create_user(
+            'benchmark-0@example.com',
+            'testpass'
+        )
+        out = StringIO()
+        call_command(
+            'benchmark', '--users', '2', '--recipes', '3',
+            '--requests', '4', '--concurrency', '2',
+            stdout=out, stderr=StringIO()
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(list(report['servers']), ['wsgi'])
+        self.assertEqual(len(report['servers']['wsgi']), 8)
+        for name, result in report['servers']['wsgi'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['requests'], 4)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(list(get_user_model().objects.all()), [existing])
+        self.assertEqual(
+            [files for _, _, files in os.walk(self.media_root) if files], []
+        )
+
+
+class GenerateDatasetCommandTests(TestCase):
+    """Load synthetic libraries through COPY"""
+
+    def generate(self, prefix, seed=1):
+        call_command(
+            'generate_dataset', '--users', '5', '--recipes', '60',
+            '--tags', '10', '--ingredients', '40', '--seed', str(seed),
+            '--email-prefix', prefix, stdout=StringIO()
+        )
+        return Recipe.objects.filter(user__email__startswith=prefix) \
+            .order_by('id')
+
+    def test_generate_dataset(self):
+        """Test users, recipes and their relations are loaded consistently"""
+        recipes = self.generate('a-')
+
+        users = get_user_model().objects.filter(email__startswith='a-')
+        self.assertEqual(users.count(), 5)
+        self.assertTrue(users[0].check_password('dataset-password'))
+        self.assertEqual(recipes.count(), 60)
+        self.assertFalse(recipes.filter(search_vector=None).exists())
+        self.assertFalse(
+            Tag.objects.exclude(recipe__user=F('user')).exists()
+        )
+        self.assertFalse(
+            Ingredient.objects.exclude(recipe__user=F('user')).exists()
+        )
+        self.assertTrue(Recipe.ingredients.through.objects.exists())
+
+        last_id = recipes.last().id
+        recipe = Recipe.objects.create(
+            user=users[0], title='Toast', time_minutes=2, price=1
+        )
+        self.assertGreater(recipe.id, last_id)
+
+    def test_generate_dataset_is_deterministic(self):
+        """Test the same seed generates the same libraries"""
+        first = self.generate('a-')
+        second = self.generate('b-')
+        other = self.generate('c-', seed=2)
+
+        fields = ('title', 'price', 'link', 'time_minutes')
+        self.assertEqual(
+            list(first.values_list(*fields)),
+            list(second.values_list(*fields))
+        )
+        self.assertNotEqual(
+            list(first.values_list(*fields)),
+            list(other.values_list(*fields))
+        )
+
+    def test_generate_dataset_existing_prefix(self):
+        """Test generating over existing users of the prefix fails"""
+        get_user_model().objects.create_user('a-0@example.com', 'pass')
 
-            self.assertEqual(gi.call_count, 6)
+        with self.assertRaises(CommandError):
+            self.generate('a-')
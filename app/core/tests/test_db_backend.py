@@ -0,0 +1,46 @@
+from django.db import connection
+from django.test import TestCase
+
+from core.db.backends.postgresql.base import DatabaseWrapper
+
+
+class HealthCheckedBackendTests(TestCase):
+    """Test the unpooled PostgreSQL backend with persistent connections"""
+
+    def _wrapper(self):
+        """Return an unshared persistent connection to the test database"""
+        settings_dict = dict(
+            connection.settings_dict,
+            ENGINE='core.db.backends.postgresql',
+            CONN_MAX_AGE=60
+        )
+        wrapper = DatabaseWrapper(settings_dict, alias=connection.alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def _backend_pid(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_dead_connection_replaced(self):
+        """Test a kept connection closed by the server is reopened"""
+        wrapper = self._wrapper()
+        pid = self._backend_pid(wrapper)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+        wrapper.close_if_unusable_or_obsolete()
+
+        self.assertNotEqual(self._backend_pid(wrapper), pid)
+
+    def test_live_connection_kept(self):
+        """Test a kept connection is reused once checked"""
+        wrapper = self._wrapper()
+        pid = self._backend_pid(wrapper)
+
+        wrapper.close_if_unusable_or_obsolete()
+
+        self.assertEqual(self._backend_pid(wrapper), pid)
+        self.assertFalse(wrapper.health_check_needed)
+        self.assertEqual(self._backend_pid(wrapper), pid)
@@ -0,0 +1,103 @@
+from django.db import connection
+from django.db.utils import OperationalError
+from django.test import TestCase
+
+from core.db.backends.postgresql_pool.base import DatabaseWrapper
+
+
+class PooledBackendTests(TestCase):
+    """Test the pooled PostgreSQL backend"""
+
+    def setUp(self):
+        self.wrappers = []
+        self.addCleanup(self._close_wrappers)
+
+    def _close_wrappers(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+        for wrapper in self.wrappers:
+            if wrapper.pool is not None:
+                wrapper.pool.close()
+
+    def _wrapper(self, max_size=1, timeout=0.05, conn_max_age=0):
+        """Return an unshared pooled connection to the test database"""
+        settings_dict = dict(
+            connection.settings_dict,
+            ENGINE='core.db.backends.postgresql_pool',
+            CONN_MAX_AGE=conn_max_age,
+            # A pool of its own, apart from the test database connection
+            OPTIONS={'application_name': self.id()[-63:]},
+            POOL={'MAX_SIZE': max_size, 'TIMEOUT': timeout}
+        )
+        wrapper = DatabaseWrapper(settings_dict, alias=connection.alias)
+        self.wrappers.append(wrapper)
+        return wrapper
+
+    def _backend_pid(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_closed_connection_is_reused(self):
+        """Test closing returns the connection to the pool for reuse"""
+        wrapper = self._wrapper()
+        pid = self._backend_pid(wrapper)
+        wrapper.close()
+
+        self.assertEqual(self._backend_pid(wrapper), pid)
+        stats = wrapper.pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['reused'], 1)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_pool_size_is_bounded(self):
+        """Test a checkout beyond the pool size times out"""
+        first = self._wrapper()
+        second = self._wrapper()
+        first.ensure_connection()
+
+        with self.assertRaises(OperationalError):
+            second.ensure_connection()
+        self.assertEqual(first.pool.stats()['timeouts'], 1)
+
+    def test_broken_connection_is_discarded(self):
+        """Test an idle connection that fails its check is replaced"""
+        wrapper = self._wrapper()
+        pid = self._backend_pid(wrapper)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+        wrapper.close()
+
+        self.assertNotEqual(self._backend_pid(wrapper), pid)
+        self.assertEqual(wrapper.pool.stats()['discarded'], 1)
+
+    def test_open_transaction_rolled_back(self):
+        """Test a connection returned mid transaction is rolled back"""
+        wrapper = self._wrapper()
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE pooled (id int)')
+        wrapper.close()
+
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('pooled')")
+            self.assertIsNone(cursor.fetchone()[0])
+
+    def test_conn_max_age_ignored(self):
+        """Test a connection goes back to the pool at the request end"""
+        wrapper = self._wrapper(conn_max_age=60)
+        pid = self._backend_pid(wrapper)
+
+        wrapper.close_if_unusable_or_obsolete()
+
+        self.assertIsNone(wrapper.connection)
+        self.assertEqual(wrapper.pool.stats()['in_use'], 0)
+        self.assertEqual(self._backend_pid(wrapper), pid)
+
+    def test_connect_at_request_start(self):
+        """Test connecting after the request start check is scheduled"""
+        wrapper = self._wrapper()
+        wrapper.close_if_unusable_or_obsolete()
+
+        self.assertIsInstance(self._backend_pid(wrapper), int)
+        self.assertTrue(wrapper.get_autocommit())
@@ -0,0 +1,58 @@
+from unittest.mock import patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase
+
+
+class HealthCheckTests(TestCase):
+    """Test the liveness and readiness probes"""
+
+    def test_liveness(self):
+        """Test the liveness probe answers without the database"""
+        with self.assertNumQueries(0):
+            res = self.client.get('/healthz')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+        self.assertEqual(res['Cache-Control'], 'no-store')
+
+    def test_readiness(self):
+        """Test the readiness probe reports the database latency"""
+        res = self.client.get('/readyz/')
+
+        self.assertEqual(res.status_code, 200)
+        data = res.json()
+        self.assertEqual(data['status'], 'ok')
+        self.assertEqual(data['migrations'], 'applied')
+        self.assertGreaterEqual(data['database']['latency_ms'], 0)
+
+    def test_readiness_migrations_cached(self):
+        """Test applied migrations are only checked once"""
+        self.client.get('/readyz')
+        with self.assertNumQueries(1):
+            res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_readiness_database_unavailable(self):
+        """Test the readiness probe fails without the database"""
+        with patch(
+            'django.db.backends.base.base.BaseDatabaseWrapper.'
+            'ensure_connection',
+            side_effect=OperationalError('connection refused')
+        ):
+            res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['status'], 'unavailable')
+
+    def test_readiness_migrations_pending(self):
+        """Test the readiness probe fails with unapplied migrations"""
+        with patch(
+            'core.middleware.MigrationExecutor.migration_plan',
+            return_value=[('migration', False)]
+        ):
+            res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['migrations'], 'pending')
@@ -0,0 +1,143 @@
+import json
+import os
+import tempfile
+import threading
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics
+
+
+def observe(registry, route='recipe:recipe-list', status=200, duration=0.02):
+    registry.observe(
+        route=route,
+        method='GET',
+        status=status,
+        duration=duration,
+        queries=3,
+        db_time=0.01,
+        render_time=0.001,
+        size=100,
+        serialize_time=0.002,
+    )
+
+
+class MetricsMiddlewareTests(TestCase):
+    """Test per route metrics are recorded and exposed"""
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_request_metrics_exposed(self):
+        """Test a request is recorded under its route"""
+        self.client.get(reverse('recipe:recipe-list'))
+
+        res = self.client.get('/metrics')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        body = res.content.decode()
+        labels = 'route="recipe:recipe-list",method="GET"'
+        self.assertIn(
+            f'http_requests_total{{{labels},status="200"}} 1',
+            body
+        )
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1',
+            body
+        )
+        self.assertIn(f'http_request_db_queries_count{{{labels}}} 1', body)
+        self.assertIn(f'http_response_serialize_seconds_count{{{labels}}} 1',
+                      body)
+        self.assertIn(f'http_response_render_seconds_count{{{labels}}} 1',
+                      body)
+        queries = [
+            line for line in body.splitlines()
+            if line.startswith(f'http_request_db_queries_sum{{{labels}}}')
+        ]
+        self.assertGreater(int(queries[0].split()[-1]), 0)
+
+    @override_settings(RECIPE_VALUES_LIST=True)
+    def test_values_list_serialize_time(self):
+        """Test list pages rendered from values() rows are timed too"""
+        self.client.get(reverse('recipe:tag-list'))
+
+        body = self.client.get('/metrics').content.decode()
+
+        labels = 'route="recipe:tag-list",method="GET"'
+        self.assertIn(f'http_response_serialize_seconds_count{{{labels}}} 1',
+                      body)
+
+    def test_unresolved_paths_share_a_label(self):
+        """Test unknown paths do not create a label each"""
+        self.client.get('/nope/1')
+        self.client.get('/nope/2')
+
+        body = self.client.get('/metrics').content.decode()
+
+        self.assertIn(
+            'http_requests_total{route="unresolved",method="GET",'
+            'status="404"} 2',
+            body
+        )
+
+
+class RegistryTests(TestCase):
+    """Test aggregating metrics across threads and processes"""
+
+    def test_concurrent_observations(self):
+        """Test observations from many threads are all counted"""
+        registry = metrics.Registry()
+        threads = [
+            threading.Thread(
+                target=lambda: [observe(registry) for _ in range(500)]
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sample = registry.collect()[('recipe:recipe-list', 'GET')]
+        self.assertEqual(sample['requests'], {'200': 4000})
+        self.assertEqual(sample['queries'], [4000, 12000])
+
+    def test_merges_process_snapshots(self):
+        """Test the snapshots of other processes are added in"""
+        with tempfile.TemporaryDirectory() as directory:
+            other = metrics.Registry()
+            observe(other, duration=2)
+            observe(other, route='recipe:tag-list', status=304)
+            with open(os.path.join(directory, '1.json'), 'w') as f:
+                json.dump(other.snapshot(), f)
+
+            registry = metrics.Registry(directory, flush_interval=0)
+            observe(registry, duration=0.001)
+            self.assertTrue(os.path.exists(
+                os.path.join(directory, f'{os.getpid()}.json')
+            ))
+
+            merged = registry.collect()
+            body = registry.render()
+
+        recipes = merged[('recipe:recipe-list', 'GET')]
+        self.assertEqual(recipes['requests'], {'200': 2})
+        self.assertEqual(recipes['buckets'][0], 1)
+        self.assertEqual(sum(recipes['buckets']), 2)
+        self.assertIn(
+            'http_requests_total{route="recipe:tag-list",method="GET",'
+            'status="304"} 1',
+            body
+        )
@@ -1,4 +1,6 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from unittest.mock import patch
 
@@ -77,3 +79,67 @@ class ModelTests(TestCase):
         exp_path = f'uploads/recipe/{uuid}.jpg'
 
         self.assertEqual(file_path, exp_path)
+
+    def test_library_version_bumped_on_write(self):
+        """Test writes to a user's library bump its version"""
+        user = sample_user()
+        version = models.LibraryVersion.objects.for_user(user)
+        self.assertEqual(version.version, 0)
+
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Salad',
+            time_minutes=5,
+            price=5.00
+        )
+        recipe.tags.add(tag)
+
+        version = models.LibraryVersion.objects.for_user(user)
+        self.assertEqual(version.version, 3)
+        self.assertIsNotNone(version.modified_at)
+
+    def test_library_version_batch(self):
+        """Test a batch bumps each changed library once"""
+        user = sample_user()
+        with models.LibraryVersion.objects.batch():
+            models.Tag.objects.create(user=user, name='Vegan')
+            models.Tag.objects.create(user=user, name='Quick')
+
+        version = models.LibraryVersion.objects.for_user(user)
+        self.assertEqual(version.version, 1)
+
+    def test_search_vector_batch(self):
+        """Test a batch refreshes each changed search document once"""
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+        with CaptureQueriesContext(connection) as ctx:
+            with models.Recipe.objects.batch():
+                recipe = models.Recipe.objects.create(
+                    user=user,
+                    title='Curry',
+                    time_minutes=5,
+                    price=5.00
+                )
+                recipe.tags.add(tag)
+                self.assertFalse(models.Recipe.objects.filter(
+                    search_vector='vegan'
+                ).exists())
+
+        refreshes = [
+            query for query in ctx.captured_queries
+            if 'SET search_vector' in query['sql']
+        ]
+        self.assertEqual(len(refreshes), 1)
+        self.assertTrue(models.Recipe.objects.filter(
+            search_vector='vegan'
+        ).exists())
+
+    def test_delete_user_with_library(self):
+        """Test deleting a user does not recreate its library version"""
+        user = sample_user()
+        models.Tag.objects.create(user=user, name='Vegan')
+
+        user.delete()
+
+        self.assertFalse(models.LibraryVersion.objects.exists())
@@ -0,0 +1,90 @@
+import os
+from unittest import skipIf
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import RequestFactory, TestCase, override_settings
+
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.querybudget import QueryBudgetExceeded, QueryBudgetMixin, \
+    over_budget
+
+
+class TagCountView(QueryBudgetMixin, APIView):
+    authentication_classes = ()
+    permission_classes = ()
+    query_budgets = {'get': (3, 1)}
+
+    def get(self, request):
+        User = get_user_model()
+        count = int(request.query_params.get('count', 1))
+        for i in range(count):
+            User.objects.filter(id=i).exists()
+        with transaction.atomic():
+            User.objects.count()
+        return Response({'count': count})
+
+
+class QueryBudgetTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _get(self, count):
+        request = self.factory.get('/', {'count': count})
+        return TagCountView.as_view()(request)
+
+    def test_over_budget(self):
+        """Test the first query over the count or duplicate budget is found"""
+        queries = [('a', []), ('b', []), ('a', []), ('c', [])]
+
+        self.assertIsNone(over_budget(queries, 4, 1))
+        self.assertEqual(over_budget(queries, 3, 1), 3)
+        self.assertEqual(over_budget(queries, 4, 0), 2)
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_within_budget(self):
+        """Test a view within its budget responds, ignoring savepoints"""
+        res = self._get(2)
+
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_over_budget_raises(self):
+        """Test an N+1 view fails with the offending SQL and stack"""
+        with self.assertRaises(QueryBudgetExceeded) as cm:
+            self._get(3)
+
+        message = str(cm.exception)
+        self.assertIn('TagCountView.get ran 4 queries (budget 3)', message)
+        self.assertIn('2 duplicates (budget 1)', message)
+        self.assertIn('> 3. SELECT', message)
+        self.assertIn('core_user', message)
+        self.assertIn('test_querybudget.py', message)
+        self.assertIn('User.objects.filter(id=i).exists()', message)
+
+    @override_settings(QUERY_BUDGET_MODE='log')
+    def test_over_budget_logs(self):
+        """Test a view over budget is logged in log mode"""
+        with self.assertLogs('core.querybudget', 'WARNING') as cm:
+            res = self._get(3)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('TagCountView.get ran 4 queries', cm.output[0])
+
+    @override_settings(QUERY_BUDGET_MODE='off')
+    def test_off(self):
+        """Test no budget is enforced when the mode is off"""
+        res = self._get(10)
+
+        self.assertEqual(res.status_code, 200)
+
+    @skipIf('QUERY_BUDGET_MODE' in os.environ, 'mode set in environment')
+    def test_enforced_in_tests(self):
+        """Test the test runner makes requests over budget fail"""
+        self.assertEqual(settings.QUERY_BUDGET_MODE, 'raise')
+        with self.assertRaises(QueryBudgetExceeded):
+            self._get(10)
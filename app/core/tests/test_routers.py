@@ -0,0 +1,91 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.db import routers
+from core.models import Recipe
+
+
+@override_settings(DATABASE_REPLICAS=['replica0', 'replica1'])
+class ReplicaRouterTests(TestCase):
+    """Test routing reads to the read replicas"""
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.addCleanup(routers.use_primary)
+
+    def test_reads_use_primary_by_default(self):
+        """Test reads go to the primary outside replica requests"""
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_reads_use_one_replica(self):
+        """Test reads stick to one replica once enabled"""
+        routers.use_replica()
+        alias = self.router.db_for_read(Recipe)
+
+        self.assertIn(alias, ('replica0', 'replica1'))
+        self.assertEqual(self.router.db_for_read(Recipe), alias)
+
+        routers.use_primary()
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_writes_use_primary(self):
+        """Test writes go to the primary, even for replica reads"""
+        routers.use_replica()
+
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+    def test_replicas_not_migrated(self):
+        """Test migrations are only applied to the primary"""
+        self.assertFalse(self.router.allow_migrate('replica0', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+    @override_settings(REPLICA_PIN_SECONDS=60)
+    def test_pin_to_primary(self):
+        """Test a user is pinned to the primary after a write"""
+        self.assertFalse(routers.is_pinned(-1))
+
+        routers.pin_to_primary(-1)
+
+        self.assertTrue(routers.is_pinned(-1))
+        self.assertFalse(routers.is_pinned(-2))
+
+
+class ReplicaPinCacheCheckTests(SimpleTestCase):
+    """Test the pin cache must be shared when replicas are configured"""
+
+    def _errors(self, backend):
+        cache_settings = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'pins': {'BACKEND': backend, 'LOCATION': '/tmp/pins'},
+        }
+        with self.settings(CACHES=cache_settings, REPLICA_PIN_CACHE='pins'):
+            self.addCleanup(caches['pins'].close)
+            return [e.id for e in routers.check_replica_pin_cache(None)]
+
+    @override_settings(DATABASE_REPLICAS=['replica0'])
+    def test_process_local_cache(self):
+        """Test a cache of one process is an error with replicas"""
+        for backend in ('locmem.LocMemCache', 'dummy.DummyCache'):
+            self.assertEqual(
+                self._errors(f'django.core.cache.backends.{backend}'),
+                ['core.E001']
+            )
+
+    @override_settings(DATABASE_REPLICAS=['replica0'])
+    def test_shared_cache(self):
+        """Test a cache shared between processes passes"""
+        self.assertEqual(
+            self._errors('django.core.cache.backends.filebased.'
+                         'FileBasedCache'),
+            []
+        )
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """Test the pin cache is not checked without replicas"""
+        self.assertEqual(
+            self._errors('django.core.cache.backends.locmem.LocMemCache'),
+            []
+        )
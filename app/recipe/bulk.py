@@ -0,0 +1,115 @@
+from django.db import transaction
+
+from core.models import Tag, Ingredient, Recipe, LibraryVersion
+
+
+RELATIONS = (
+    ('tags', Tag, Recipe.tags.through, 'tag_id'),
+    ('ingredients', Ingredient, Recipe.ingredients.through, 'ingredient_id'),
+)
+
+
+def check_duplicate_ids(items):
+    """Return per item errors for ids named by an earlier item"""
+    seen = set()
+    errors = []
+    for item in items:
+        errors.append({'id': ['Duplicate id.']} if item['id'] in seen else {})
+        seen.add(item['id'])
+
+    return errors
+
+
+def check_related_ids(user, items):
+    """Return per item errors for tag and ingredient ids the user lacks"""
+    errors = [{} for _ in items]
+    for name, model, _, _ in RELATIONS:
+        requested = {pk for item in items for pk in item.get(name, ())}
+        owned = set(
+            model.objects.filter(user=user, id__in=requested)
+            .values_list('id', flat=True)
+        )
+        for item, item_errors in zip(items, errors):
+            missing = [pk for pk in item.get(name, ()) if pk not in owned]
+            if missing:
+                item_errors[name] = [
+                    f'Invalid pk "{pk}" - object does not exist.'
+                    for pk in missing
+                ]
+
+    return errors
+
+
+def add_related(recipe_ids, items, batch_size=None):
+    """Insert the through table rows linking recipes to tags/ingredients"""
+    for name, _, through, column in RELATIONS:
+        rows = [
+            through(recipe_id=recipe_id, **{column: pk})
+            for recipe_id, item in zip(recipe_ids, items)
+            if name in item
+            for pk in set(item[name])
+        ]
+        through.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def create_recipes(user, items, batch_size=None):
+    """Create recipes with their relations in one transaction"""
+    with transaction.atomic(), LibraryVersion.objects.batch():
+        recipes = Recipe.objects.bulk_create(
+            [
+                Recipe(user=user, **_fields(item))
+                for item in items
+            ],
+            batch_size=batch_size
+        )
+        add_related([r.id for r in recipes], items, batch_size)
+        Recipe.objects.refresh_search_vectors([r.id for r in recipes])
+        LibraryVersion.objects.bump(user.id)
+
+    return recipes
+
+
+def update_recipes(user, items):
+    """Update recipes, replacing the relations given in each item
+
+    Returns the ids of the items that are not recipes owned by the user
+    instead of updating anything when there are any.
+    """
+    ids = [item['id'] for item in items]
+    owned = set(
+        Recipe.objects.filter(user=user, id__in=ids)
+        .values_list('id', flat=True)
+    )
+    missing = [pk for pk in ids if pk not in owned]
+    if missing:
+        return missing
+
+    with transaction.atomic(), LibraryVersion.objects.batch():
+        for item in items:
+            fields = _fields(item)
+            if fields:
+                Recipe.objects.filter(id=item['id']).update(**fields)
+
+        for name, _, through, _ in RELATIONS:
+            replaced = [item['id'] for item in items if name in item]
+            if replaced:
+                through.objects.filter(recipe_id__in=replaced).delete()
+        add_related(ids, items)
+        Recipe.objects.refresh_search_vectors(ids)
+        LibraryVersion.objects.bump(user.id)
+
+    return []
+
+
+def delete_recipes(user, ids):
+    """Delete the user's recipes with the given ids"""
+    with transaction.atomic(), LibraryVersion.objects.batch():
+        return Recipe.objects.filter(user=user, id__in=ids).delete()
+
+
+def _fields(item):
+    """Return the concrete recipe fields of a bulk item"""
+    return {
+        key: value for key, value in item.items()
+        if key not in ('id', 'tags', 'ingredients')
+    }
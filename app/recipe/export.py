@@ -0,0 +1,77 @@
+import json
+from itertools import islice
+
+from core.models import Recipe
+
+
+RELATIONS = (
+    ('ingredients', Recipe.ingredients.through, 'ingredient'),
+    ('tags', Recipe.tags.through, 'tag'),
+)
+
+
+IMAGE_FIELDS = ('image', 'image_thumbnail', 'image_medium', 'image_webp')
+
+
+def iter_ndjson(queryset, chunk_size=500, request=None):
+    """Yield recipes with their tags and ingredients as JSON lines
+
+    Recipes are read through a server side cursor and their relations are
+    fetched once per chunk, so memory use does not grow with the library.
+    Image URLs are absolute when the request is given, as in the API.
+    """
+    rows = queryset.order_by('id').values(
+        'id', 'title', 'time_minutes', 'price', 'link', 'image_status',
+        *IMAGE_FIELDS
+    ).iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        ids = [row['id'] for row in chunk]
+        related = {
+            name: _related(through, field, ids)
+            for name, through, field in RELATIONS
+        }
+        yield ''.join(
+            json.dumps({
+                'id': row['id'],
+                'title': row['title'],
+                'ingredients': related['ingredients'].get(row['id'], []),
+                'tags': related['tags'].get(row['id'], []),
+                'time_minutes': row['time_minutes'],
+                'price': str(row['price']),
+                'link': row['link'],
+                **{
+                    name: _image_url(name, row[name], request)
+                    for name in IMAGE_FIELDS
+                },
+                'image_status': row['image_status'],
+            }, separators=(',', ':')) + '\n'
+            for row in chunk
+        )
+
+
+def _related(through, field, recipe_ids):
+    """Return {recipe id: [{id, name}]} for one relation of the recipes"""
+    related = {}
+    rows = through.objects.filter(recipe_id__in=recipe_ids).order_by(
+        'recipe_id', f'{field}_id'
+    ).values_list('recipe_id', f'{field}_id', f'{field}__name')
+    for recipe_id, pk, name in rows:
+        related.setdefault(recipe_id, []).append({'id': pk, 'name': name})
+
+    return related
+
+
+def _image_url(name, value, request):
+    """Return the URL of an image file name, or None without a file"""
+    if not value:
+        return None
+    url = Recipe._meta.get_field(name).storage.url(value)
+    if request is not None:
+        return request.build_absolute_uri(url)
+
+    return url
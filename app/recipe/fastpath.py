@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import IntegerField, OuterRef, Subquery
+from django.db.models.fields.files import FieldFile
+
+from rest_framework.fields import FileField
+
+
+class IdArray(Subquery):
+    """Array of the ids a recipe is linked to through an m2m table"""
+    template = 'ARRAY(%(subquery)s)'
+
+    def __init__(self, through, column):
+        super().__init__(
+            through.objects.filter(recipe_id=OuterRef('id'))
+            .order_by(column).values(column),
+            output_field=ArrayField(IntegerField())
+        )
+
+
+def values_queryset(queryset, field_names, relations=(), extra=()):
+    """Select the fields as values() rows with m2m fields as id arrays
+
+    Relations are (field name, through model, id column) and are fetched
+    as ``<name>_ids`` arrays in the same query. Extra names, such as the
+    pagination ordering, are selected as well.
+    """
+    related = {
+        name: IdArray(through, column)
+        for name, through, column in relations
+        if name in field_names
+    }
+    columns = [name for name in field_names if name not in related]
+    columns += [f'{name}_ids' for name in related]
+    columns += [name for name in extra if name not in columns]
+
+    return queryset.prefetch_related(None).annotate(**{
+        f'{name}_ids': array for name, array in related.items()
+    }).values(*columns)
+
+
+def to_representation(fields, rows, relations=(), model=None):
+    """Render values() rows as the serializer with these fields would
+
+    File names of the model's file fields are wrapped in the file the
+    serializer field renders as a URL.
+    """
+    related = {name for name, _, _ in relations}
+    files = {
+        name: model._meta.get_field(field.source)
+        for name, field in fields.items()
+        if isinstance(field, FileField)
+    }
+    data = []
+    for row in rows:
+        item = OrderedDict()
+        for name, field in fields.items():
+            if name in related:
+                item[name] = row[f'{name}_ids']
+            elif name in files:
+                item[name] = field.to_representation(
+                    FieldFile(None, files[name], row[name])
+                )
+            else:
+                value = row[name]
+                item[name] = None if value is None else \
+                    field.to_representation(value)
+        data.append(item)
+
+    return data
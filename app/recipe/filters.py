@@ -0,0 +1,30 @@
+from django.db.models import Count
+
+from core.models import Recipe
+
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+RELATIONS = {
+    'tags': (Recipe.tags.through, 'tag_id'),
+    'ingredients': (Recipe.ingredients.through, 'ingredient_id'),
+}
+
+
+def filter_related(queryset, relation, ids, match=MATCH_ANY):
+    """Filter recipes by the tag or ingredient ids they are linked to
+
+    The through table is probed in a single semi-join, so recipes are
+    never repeated and no DISTINCT is needed. With match=all the links are
+    grouped per recipe and only recipes linked to every id are kept.
+    """
+    through, column = RELATIONS[relation]
+    ids = set(ids)
+    links = through.objects.filter(**{f'{column}__in': ids})
+    if match == MATCH_ALL:
+        links = links.values('recipe_id').annotate(
+            matched=Count(column)
+        ).filter(matched=len(ids))
+
+    return queryset.filter(id__in=links.values('recipe_id'))
@@ -0,0 +1,179 @@
+import json
+import math
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a compound, unique ordering
+
+    The cursor holds the ordering values of the last row of a page, so the
+    next page is found with a range condition on the index instead of an
+    OFFSET, and deep pages cost the same as the first one.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering = ('-id',)
+
+    def __init__(self):
+        self.page_size = settings.RECIPE_PAGE_SIZE
+        self.max_page_size = settings.RECIPE_MAX_PAGE_SIZE
+
+    def get_ordering(self, view):
+        """Return the ordering for the view, the last field must be unique"""
+        return getattr(view, 'keyset_ordering', None) or self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keyset = self.get_ordering(view)
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self._reverse(self.keyset) if reverse else self.keyset
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._after(ordering, position))
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else position is not None
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self._position(self.page[0]), True)
+
+    def decode_cursor(self, request):
+        """Return the position and direction encoded in the request cursor"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')))
+            position, reverse = cursor['p'], bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or \
+                len(position) != len(self.keyset) or \
+                not all(map(self._is_position_value, position)):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, reverse
+
+    def _is_position_value(self, value):
+        """Return whether a cursor value can be sent to the database
+
+        Ordering values are finite numbers or text, and Postgres rejects
+        text holding a NUL character when the query runs.
+        """
+        if isinstance(value, bool):
+            return False
+        if isinstance(value, int):
+            return True
+        if isinstance(value, float):
+            return math.isfinite(value)
+        return isinstance(value, str) and '\x00' not in value
+
+    def encode_cursor(self, position, reverse):
+        """Return the page URL for a cursor at the given position"""
+        cursor = {'p': position}
+        if reverse:
+            cursor['r'] = 1
+        encoded = b64encode(json.dumps(cursor).encode('utf-8'))
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            encoded.decode('ascii')
+        )
+
+    def _position(self, row):
+        """Return the ordering values of a page row"""
+        values = []
+        for field in self.keyset:
+            name = field.lstrip('-')
+            if isinstance(row, dict):
+                values.append(row[name])
+            else:
+                values.append(getattr(row, name))
+        return values
+
+    def _reverse(self, ordering):
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in ordering
+        )
+
+    def _after(self, ordering, position):
+        """Build the row comparison selecting rows after the position
+
+        (a, b) > (x, y) is expanded to a > x OR (a = x AND b > y) so each
+        field can have its own direction, plus a redundant a >= x which
+        gives the planner a range to start the index scan from.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        first = ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{lookup}': position[0]}) & \
+            condition
+
+
+class RecipeKeysetPagination(KeysetPagination):
+    """Paginate recipes along the (user_id, id) index"""
+    ordering = ('-id',)
+
+
+class NameKeysetPagination(KeysetPagination):
+    """Paginate tags and ingredients along the (user_id, -name, id) index"""
+    ordering = ('-name', 'id')
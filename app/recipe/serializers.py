@@ -1,33 +1,92 @@
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from core import images
+from core.metrics import SerializeTimeMixin, TimedListSerializer
 from core.models import Tag, Ingredient, Recipe
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SerializeTimeMixin, serializers.ModelSerializer):
     """Serializer for tag objects"""
 
     class Meta:
         model = Tag
         fields = ('id', 'name',)
         read_only_fields = ('id',)
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(SerializeTimeMixin,
+                           serializers.ModelSerializer):
     """Serializer for ingredient objects"""
 
     class Meta:
         model = Ingredient
         fields = ('id', 'name',)
         read_only_fields = ('id',)
+        list_serializer_class = TimedListSerializer
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Limit the output of a serializer to the names given as fields"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ManyPrimaryKeyRelatedField(serializers.ManyRelatedField):
+    """Look up the primary keys of a to-many field in one query"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        pks = []
+        for item in data:
+            if isinstance(item, bool):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+            try:
+                pks.append(int(item))
+            except (TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+
+        objects = child.get_queryset().in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field whose many=True form validates in one query"""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return ManyPrimaryKeyRelatedField(**list_kwargs)
+
+
+class RecipeSerializer(SerializeTimeMixin,
+                       SparseFieldsMixin,
+                       serializers.ModelSerializer):
     """Serializer for Recipe"""
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = BulkPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
@@ -35,8 +94,11 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes',
-                  'price', 'link',)
-        read_only_fields = ('id',)
+                  'price', 'link', 'image', 'image_thumbnail',
+                  'image_medium', 'image_webp', 'image_status',)
+        read_only_fields = ('id', 'image', 'image_thumbnail', 'image_medium',
+                            'image_webp', 'image_status',)
+        list_serializer_class = TimedListSerializer
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -45,10 +107,56 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """Serializer for one recipe of a bulk request
+
+    Related ids are checked against the user's tags and ingredients for the
+    whole batch at once rather than per primary key.
+    """
+    id = serializers.IntegerField(required=False)
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes',
+                  'price', 'link',)
+
+    def validate(self, attrs):
+        """Require the recipe id when updating and ignore it on create"""
+        if not self.partial:
+            attrs.pop('id', None)
+        elif 'id' not in attrs:
+            raise serializers.ValidationError(
+                {'id': 'This field is required.'}
+            )
+
+        return attrs
+
+
+class RecipeImageSerializer(SerializeTimeMixin,
+                            serializers.ModelSerializer):
     """Serializer for uploading images to recipe"""
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image',)
-        read_only_fields = ('id',)
+        fields = ('id', 'image', 'image_thumbnail', 'image_medium',
+                  'image_webp', 'image_status',)
+        read_only_fields = ('id', 'image_thumbnail', 'image_medium',
+                            'image_webp', 'image_status',)
+
+    def update(self, instance, validated_data):
+        """Save the new image and queue generating its variants"""
+        previous_name = instance.image.name
+        images.reset(instance)
+        instance = super().update(instance, validated_data)
+        images.retain(instance, previous_name)
+        images.schedule(instance)
+
+        return instance
@@ -0,0 +1,97 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+
+def media_url(name):
+    """Return the media URL of a stored file"""
+    return reverse('media', args=[name])
+
+
+class RecipeMediaApiTests(TestCase):
+    """Test serving recipe images"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+        self.recipe.image.save('photo.jpg', ContentFile(b'jpeg bytes'))
+        self.addCleanup(self.recipe.image.delete, save=False)
+        self.name = self.recipe.image.name
+
+    def test_login_required(self):
+        """Test authentication is required for media files"""
+        res = APIClient().get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_other_users_image_not_found(self):
+        """Test images of other users' recipes are not served"""
+        other = get_user_model().objects.create_user(
+            'other@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_serve_from_django(self):
+        """Test the file is sent by Django with immutable caching"""
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'jpeg bytes')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(
+            res['Cache-Control'],
+            'private, max-age=31536000, immutable'
+        )
+
+    @override_settings(
+        MEDIA_SERVE_MODE='x-accel',
+        MEDIA_ACCEL_PREFIX='/protected-media/'
+    )
+    def test_serve_with_x_accel_redirect(self):
+        """Test the file is handed to nginx with X-Accel-Redirect"""
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'/protected-media/{self.name}'
+        )
+        self.assertEqual(res.content, b'')
+
+    @override_settings(MEDIA_SERVE_MODE='x-sendfile')
+    def test_serve_with_x_sendfile(self):
+        """Test the file is handed to the web server with X-Sendfile"""
+        res = self.client.get(media_url(self.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Sendfile'], self.recipe.image.path)
+        self.assertEqual(res.content, b'')
+
+    def test_path_traversal_not_found(self):
+        """Test paths outside the stored names are not served"""
+        res = self.client.get(media_url(os.path.join('..', self.name)))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
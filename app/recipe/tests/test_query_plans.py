@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+
+
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class QueryPlanTests(TestCase):
+    """Test list queries are answered from the library indexes
+
+    Sequential and bitmap scans are disabled so the planner picks an
+    ordered index scan whenever one can serve the query, as it would on
+    large tables.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Toast',
+            time_minutes=5,
+            price=1.00
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Breakfast'))
+        Tag.objects.create(user=self.user, name='Lunch')
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Bread')
+        )
+        Recipe.objects.create(
+            user=self.user,
+            title='Eggs',
+            time_minutes=5,
+            price=1.00
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+
+    def _plan(self, url, table, params=None):
+        """Return the query plan of the list query on a table"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+            if res.data['next']:
+                self.client.get(res.data['next'])
+
+        sql = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and f'FROM "{table}"' in q['sql']
+        ][-1]
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def test_tag_page_uses_user_name_index(self):
+        """Test a tag page is a range scan of the (user, -name, id) index"""
+        plan = self._plan(TAGS_URL, 'core_tag', {'page_size': 1})
+
+        self.assertIn('using core_tag_user_name_idx', plan)
+        self.assertIn('name <=', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_assigned_only_is_a_semi_join(self):
+        """Test assigned_only probes the through table instead of DISTINCT"""
+        plan = self._plan(INGREDIENTS_URL, 'core_ingredient',
+                          {'assigned_only': 1})
+
+        self.assertIn('Semi Join', plan)
+        self.assertIn('core_recipe_ingredients_ingredient_recipe_idx', plan)
+        self.assertNotIn('Unique', plan)
+
+    def test_recipe_list_uses_user_id_index(self):
+        """Test listing recipes scans the (user, id) index"""
+        plan = self._plan(RECIPES_URL, 'core_recipe', {'page_size': 1})
+
+        self.assertIn('using core_recipe_user_id_idx', plan)
+        self.assertIn('id <', plan)
+        self.assertNotIn('Sort', plan)
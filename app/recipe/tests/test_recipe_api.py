@@ -1,20 +1,29 @@
+import json
 import tempfile
 import os
+from datetime import timedelta
+from unittest.mock import patch
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Tag, Ingredient
+from core import images
+from core.models import Recipe, Tag, Ingredient, ImageBlob, LibraryVersion
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
 RECIPE_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+EXPORT_URL = reverse('recipe:recipe-export')
 
 
 def image_upload_url(recipe_id):
@@ -84,7 +93,7 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_limited_to_user(self):
         """Test recipe return for authenticated user only"""
@@ -101,8 +110,8 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_recipe_detail(self):
         """Test viewing a recipe detail"""
@@ -238,9 +247,12 @@ class RecipeImageUploadTests(TestCase):
 
         self.client.force_authenticate(self.user)
         self.recipe = sample_recipe(user=self.user)
-
-    def tearDown(self):
-        self.recipe.image.delete()
+        # Uploads and their variants land in a directory removed afterwards
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
 
     def test_upload_image_to_recipe(self):
         """Test uploading image to recipe"""
@@ -257,6 +269,105 @@ class RecipeImageUploadTests(TestCase):
             self.assertIn('image', res.data)
             self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def _upload(self, size=(1200, 900)):
+        """Upload a JPEG of the given size to the sample recipe"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', size).save(ntf, format='JPEG')
+            ntf.seek(0)
+            return self.client.post(url, {'image': ntf}, format='multipart')
+
+    def _delete_variants(self):
+        self.recipe.refresh_from_db()
+        for field in images.VARIANT_FIELDS:
+            getattr(self.recipe, field).delete(save=False)
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    def test_upload_generates_variants(self):
+        """Test resized variants are generated for an uploaded image"""
+        res = self._upload()
+        self.addCleanup(self._delete_variants)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_READY)
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image_thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (200, 150))
+        with Image.open(self.recipe.image_medium.path) as medium:
+            self.assertEqual(medium.size, (800, 600))
+        with Image.open(self.recipe.image_webp.path) as webp:
+            self.assertEqual(webp.format, 'WEBP')
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    def test_image_fields_in_recipe_output(self):
+        """Test lists and details render the image status and variants"""
+        res = self._upload()
+        self.addCleanup(self._delete_variants)
+        image_fields = {
+            name: res.data[name] for name in (
+                'image', 'image_thumbnail', 'image_medium', 'image_webp',
+                'image_status',
+            )
+        }
+
+        detail = self.client.get(detail_url(self.recipe.id))
+        listed = self.client.get(RECIPE_URL)
+
+        self.assertEqual(image_fields['image_status'], Recipe.IMAGE_READY)
+        self.assertIsNotNone(image_fields['image_webp'])
+        for data in (detail.data, listed.data['results'][0]):
+            self.assertEqual(
+                {name: data[name] for name in image_fields},
+                image_fields
+            )
+
+    def test_upload_queues_variants(self):
+        """Test variants are left to the workers outside the request"""
+        with patch('core.images.transaction.on_commit') as on_commit:
+            res = self._upload()
+
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.assertIsNone(res.data['image_thumbnail'])
+        on_commit.assert_called_once()
+
+    def test_processed_image_changes_etag(self):
+        """Test a read cached while pending is refreshed once processed"""
+        with patch('core.images.transaction.on_commit'):
+            self._upload()
+        self.addCleanup(self._delete_variants)
+        url = detail_url(self.recipe.id)
+        res = self.client.get(url)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+
+        images.process_recipe_image(self.recipe.id)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_READY)
+        self.assertIsNotNone(res.data['image_thumbnail'])
+
+    def test_unreadable_image_fails(self):
+        """Test processing an unreadable image marks it as failed"""
+        self.recipe.image.save('broken.jpg', ContentFile(b'not a jpeg'))
+
+        images.process_recipe_image(self.recipe.id)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_upload_too_large(self):
+        """Test an image over the upload limit is rejected"""
+        with patch('core.images.transaction.on_commit'):
+            res = self._upload()
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
     def test_uploading_image_bad_request(self):
         """Test uploading a invalid image"""
         url = image_upload_url(self.recipe.id)
@@ -284,9 +395,9 @@ class RecipeImageUploadTests(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
 
     def test_filter_recipes_by_ingredients(self):
         """Test returning recipes with specific ingredients"""
@@ -308,6 +419,828 @@ class RecipeImageUploadTests(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
+
+
+@override_settings(
+    RECIPE_IMAGE_STORAGE='content',
+    RECIPE_IMAGE_WORKERS=0,
+    DEFAULT_FILE_STORAGE='core.storage.ContentAddressedStorage'
+)
+class ContentAddressedImageTests(TestCase):
+    """Tests for storing recipe images by their content"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe1 = sample_recipe(user=self.user)
+        self.recipe2 = sample_recipe(user=self.user)
+        on_commit = patch(
+            'core.images.transaction.on_commit',
+            side_effect=lambda func: func()
+        )
+        on_commit.start()
+        self.addCleanup(on_commit.stop)
+
+    def _upload(self, recipe, color='red'):
+        url = image_upload_url(recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.JPG') as ntf:
+            Image.new('RGB', (300, 300), color).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.addCleanup(images._delete_unreferenced,
+                        recipe.image.name, recipe.image.storage)
+        return recipe.image
+
+    def test_identical_uploads_share_file(self):
+        """Test the same image uploaded twice is stored once"""
+        image1 = self._upload(self.recipe1)
+        mtime = os.path.getmtime(image1.path)
+        image2 = self._upload(self.recipe2)
+
+        digest = os.path.splitext(os.path.basename(image1.name))[0]
+        self.assertEqual(image1.name, os.path.join(
+            'uploads/recipe', digest[:2], digest[2:4], f'{digest}.jpg'
+        ))
+        self.assertEqual(image1.name, image2.name)
+        self.assertEqual(os.path.getmtime(image2.path), mtime)
+        self.assertEqual(ImageBlob.objects.get(name=image1.name).refcount, 2)
+        self.recipe2.refresh_from_db()
+        self.assertEqual(
+            self.recipe2.image_thumbnail.name,
+            Recipe.objects.get(id=self.recipe1.id).image_thumbnail.name
+        )
+
+    def test_last_reference_deletes_files(self):
+        """Test an image is deleted with the last recipe using it"""
+        image = self._upload(self.recipe1)
+        self._upload(self.recipe2)
+        self.recipe1.refresh_from_db()
+        thumbnail = self.recipe1.image_thumbnail.path
+
+        self.recipe1.delete()
+        self.assertTrue(os.path.exists(image.path))
+
+        self.recipe2.delete()
+        self.assertFalse(os.path.exists(image.path))
+        self.assertFalse(os.path.exists(thumbnail))
+        self.assertFalse(ImageBlob.objects.filter(name=image.name).exists())
+
+    def test_replaced_image_is_released(self):
+        """Test replacing a recipe image releases the previous one"""
+        previous = self._upload(self.recipe1, 'red')
+        self._upload(self.recipe1, 'blue')
+
+        self.assertFalse(os.path.exists(previous.path))
+        self.assertFalse(
+            ImageBlob.objects.filter(name=previous.name).exists()
+        )
+
+
+class RecipeQueryCountTests(TestCase):
+    """Test the number of queries per recipe action stays constant"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _sample_recipes(self, count):
+        """Create recipes that each have a tag and an ingredient"""
+        tag = sample_Tags(user=self.user)
+        ingredient = sample_Ingredients(user=self.user)
+        for i in range(count):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        return recipe
+
+    def test_list_query_count_is_constant(self):
+        """Test listing recipes does not issue a query per recipe"""
+        self._sample_recipes(1)
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 1)
+
+        self._sample_recipes(10)
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 11)
+
+    def test_retrieve_query_count(self):
+        """Test retrieving a recipe prefetches its tags and ingredients"""
+        recipe = self._sample_recipes(3)
+        recipe.tags.add(sample_Tags(user=self.user, name='Vegan'))
+
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(len(res.data['tags']), 2)
+
+    def test_create_looks_up_relations_once(self):
+        """Test the tags and ingredients of a recipe are looked up in bulk"""
+        tags = [sample_Tags(user=self.user, name=f'Tag {i}') for i in range(5)]
+        ingredients = [
+            sample_Ingredients(user=self.user, name=f'Ingredient {i}')
+            for i in range(5)
+        ]
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': 5.00,
+            'tags': [tag.id for tag in tags],
+            'ingredients': [str(ingredient.id) for ingredient in ingredients],
+        }
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(RECIPE_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        lookups = [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith('SELECT') and
+            'FROM "core_tag" WHERE' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 5)
+        self.assertEqual(recipe.ingredients.count(), 5)
+
+    def test_write_refreshes_search_once(self):
+        """Test saving a recipe and its relations refreshes search once"""
+        tag = sample_Tags(user=self.user)
+        ingredient = sample_Ingredients(user=self.user)
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': 5.00,
+            'tags': [tag.id],
+            'ingredients': [ingredient.id],
+        }
+
+        with CaptureQueriesContext(connection) as created:
+            res = self.client.post(RECIPE_URL, payload)
+        with CaptureQueriesContext(connection) as updated:
+            self.client.put(
+                detail_url(res.data['id']),
+                dict(payload, title='Soup', tags=[], ingredients=[])
+            )
+
+        for ctx in (created, updated):
+            refreshes = [
+                query for query in ctx.captured_queries
+                if 'SET search_vector' in query['sql']
+            ]
+            self.assertEqual(len(refreshes), 1)
+        self.assertTrue(
+            Recipe.objects.filter(search_vector='soup').exists()
+        )
+
+    def test_create_unknown_relation(self):
+        """Test creating a recipe with a missing tag fails"""
+        tag = sample_Tags(user=self.user)
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': 5.00,
+            'tags': [tag.id, tag.id + 100],
+            'ingredients': ['x'],
+        }
+
+        res = self.client.post(RECIPE_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data['tags'],
+            [f'Invalid pk "{tag.id + 100}" - object does not exist.']
+        )
+        self.assertIn('Incorrect type', res.data['ingredients'][0])
+
+
+class RecipeValuesListTests(TestCase):
+    """Test list pages rendered from values() rows match the serializer"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        tags = [sample_Tags(user=self.user, name=n) for n in ('a', 'b')]
+        ingredient = sample_Ingredients(user=self.user)
+        for i in range(5):
+            recipe = sample_recipe(
+                user=self.user,
+                title=f'Spicy curry {i}',
+                price=f'{i}.5',
+                link='https://example.com' if i % 2 else ''
+            )
+            recipe.tags.set(tags[:i % 3])
+            if i:
+                recipe.ingredients.add(ingredient)
+        self.tag = tags[0]
+        Recipe.objects.filter(id=recipe.id).update(
+            image='uploads/recipe/a.jpg',
+            image_thumbnail='uploads/recipe/a.thumb.jpg',
+            image_status=Recipe.IMAGE_PENDING
+        )
+
+    def _assert_parity(self, url, params=None):
+        """Assert both list paths give the same page and links"""
+        res = self.client.get(url, params)
+        with override_settings(RECIPE_VALUES_LIST=True):
+            fast = self.client.get(url, params)
+
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(fast.content), json.loads(res.content))
+        return fast
+
+    def test_recipe_list_parity(self):
+        """Test recipe lists, pages, filters and search match"""
+        res = self._assert_parity(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 5)
+        self._assert_parity(RECIPE_URL, {'page_size': 2})
+        self._assert_parity(RECIPE_URL, {'tags': str(self.tag.id)})
+        self._assert_parity(RECIPE_URL, {'q': 'curry', 'page_size': 2})
+        self._assert_parity(RECIPE_URL, {'fields': 'id,tags'})
+        self._assert_parity(RECIPE_URL, {'fields': 'id,image,image_status'})
+
+    def test_name_list_parity(self):
+        """Test tag and ingredient lists match"""
+        self._assert_parity(reverse('recipe:tag-list'))
+        self._assert_parity(
+            reverse('recipe:ingredient-list'),
+            {'assigned_only': 1}
+        )
+
+    @override_settings(RECIPE_VALUES_LIST=True)
+    def test_recipe_list_single_query(self):
+        """Test relations are fetched with the recipes in one query"""
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 5)
+
+
+class RecipeSparseFieldsTests(TestCase):
+    """Test selecting recipe fields with ?fields="""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+        self.recipe.tags.add(sample_Tags(user=self.user))
+        self.recipe.ingredients.add(sample_Ingredients(user=self.user))
+
+    def test_list_selected_fields(self):
+        """Test only the selected columns are loaded and rendered"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPE_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            [{'id': self.recipe.id, 'title': self.recipe.title}]
+        )
+        recipe_queries = [
+            q['sql'] for q in queries.captured_queries
+            if 'FROM "core_recipe"' in q['sql']
+        ]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertNotIn('"price"', recipe_queries[0])
+        self.assertFalse(any(
+            'core_recipe_tags' in q['sql'] or
+            'core_recipe_ingredients' in q['sql']
+            for q in queries.captured_queries
+        ))
+
+    def test_retrieve_selected_relation(self):
+        """Test a detail with only a relation fetches only that relation"""
+        with self.assertNumQueries(3):
+            res = self.client.get(
+                detail_url(self.recipe.id),
+                {'fields': 'id,tags'}
+            )
+
+        self.assertEqual(list(res.data), ['id', 'tags'])
+        self.assertEqual(res.data['tags'][0]['name'], 'Dinner')
+
+    def test_unknown_field_rejected(self):
+        """Test requesting an unknown field is a bad request"""
+        res = self.client.get(RECIPE_URL, {'fields': 'id,user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+
+    def test_fields_ignored_on_create(self):
+        """Test writes are validated and rendered with every field"""
+        payload = {'title': 'Cake', 'time_minutes': 30, 'price': 5}
+        res = self.client.post(f'{RECIPE_URL}?fields=id', payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['title'], 'Cake')
+
+
+class RecipePaginationTests(TestCase):
+    """Test cursor pagination of the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            sample_recipe(user=self.user, title=f'Recipe {i}')
+            for i in range(5)
+        ]
+
+    def test_walk_pages_forward_and_back(self):
+        """Test following next and previous links visits every recipe"""
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['previous'])
+
+        ids = [r['id'] for r in res.data['results']]
+        pages = [res]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [r['id'] for r in res.data['results']]
+            pages.append(res)
+
+        expected = sorted((r.id for r in self.recipes), reverse=True)
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+
+        res = self.client.get(pages[-1].data['previous'])
+        self.assertEqual(res.data['results'], pages[-2].data['results'])
+
+    def test_page_size_is_capped(self):
+        """Test the requested page size cannot exceed the maximum"""
+        with self.settings(RECIPE_MAX_PAGE_SIZE=3):
+            res = self.client.get(RECIPE_URL, {'page_size': 100})
+
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor returns not found"""
+        res = self.client.get(RECIPE_URL, {'cursor': 'garbage'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.get(RECIPE_URL, {'cursor': 'eyJwIjogWyJ4Il19'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeBulkApiTests(TestCase):
+    """Test the bulk recipe endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_recipes(self):
+        """Test creating several recipes with relations in one request"""
+        tag = sample_Tags(user=self.user)
+        ingredient = sample_Ingredients(user=self.user)
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 10,
+                'price': '5.00',
+                'tags': [tag.id],
+                'ingredients': [ingredient.id],
+            }
+            for i in range(3)
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['title'] for r in res.data],
+                         [item['title'] for item in payload])
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [tag])
+            self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+
+    def test_bulk_create_ignores_list_filters(self):
+        """Test list query parameters do not hide the created recipes"""
+        payload = [{'title': 'Soup', 'time_minutes': 5, 'price': '1.00'}]
+
+        res = self.client.post(
+            BULK_URL + '?q=zzz&tags=1',
+            payload,
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data[0]['title'], 'Soup')
+
+    def test_bulk_create_query_count_is_constant(self):
+        """Test the number of queries does not grow with the batch size"""
+        tag = sample_Tags(user=self.user)
+
+        def payload(count):
+            return [
+                {'title': 'Soup', 'time_minutes': 5, 'price': '1.00',
+                 'tags': [tag.id]}
+                for _ in range(count)
+            ]
+
+        with self.assertNumQueries(10):
+            self.client.post(BULK_URL, payload(1), format='json')
+        with self.assertNumQueries(10):
+            self.client.post(BULK_URL, payload(20), format='json')
+
+    def test_bulk_create_reports_item_errors(self):
+        """Test invalid items are reported per item and nothing is saved"""
+        user2 = get_user_model().objects.create_user(
+            'user2@test.com',
+            'testpass'
+        )
+        other_tag = sample_Tags(user=user2)
+        payload = [
+            {'title': 'Good', 'time_minutes': 5, 'price': '1.00'},
+            {'title': 'Stolen tag', 'time_minutes': 5, 'price': '1.00',
+             'tags': [other_tag.id]},
+            {'title': 'No time', 'price': '1.00'},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('time_minutes', res.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+        res = self.client.post(BULK_URL, payload[:2], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('tags', res.data[1])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_update_recipes(self):
+        """Test updating fields and relations of several recipes"""
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        recipe2.tags.add(sample_Tags(user=self.user))
+        new_tag = sample_Tags(user=self.user, name='Vegan')
+        payload = [
+            {'id': recipe1.id, 'title': 'Renamed'},
+            {'id': recipe2.id, 'tags': [new_tag.id]},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe1.refresh_from_db()
+        self.assertEqual(recipe1.title, 'Renamed')
+        self.assertEqual(list(recipe2.tags.all()), [new_tag])
+        self.assertEqual(res.data[1]['tags'], [new_tag.id])
+
+    def test_bulk_update_requires_owned_ids(self):
+        """Test updating recipes of another user fails"""
+        user2 = get_user_model().objects.create_user(
+            'user2@test.com',
+            'testpass'
+        )
+        recipe = sample_recipe(user=user2)
+        payload = [{'id': recipe.id, 'title': 'Mine now'}, {'title': 'x'}]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', res.data[1])
+
+        res = self.client.patch(BULK_URL, payload[:1], format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.title, 'Mine now')
+
+    def test_bulk_update_rejects_duplicate_ids(self):
+        """Test a recipe named twice is reported and nothing is saved"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_Tags(user=self.user)
+        payload = [
+            {'id': recipe.id, 'tags': [tag.id]},
+            {'id': recipe.id, 'title': 'Renamed', 'tags': [tag.id]},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data, [{}, {'id': ['Duplicate id.']}])
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.title, 'Renamed')
+        self.assertFalse(recipe.tags.exists())
+
+    def test_bulk_delete_recipes(self):
+        """Test deleting a list of recipes only deletes the user's own"""
+        user2 = get_user_model().objects.create_user(
+            'user2@test.com',
+            'testpass'
+        )
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        other = sample_recipe(user=user2)
+
+        res = self.client.delete(
+            BULK_URL,
+            [recipe1.id, other.id],
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            list(Recipe.objects.order_by('id')),
+            [recipe2, other]
+        )
+
+
+class RecipeExportApiTests(TestCase):
+    """Test streaming the recipe library as NDJSON"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _export(self):
+        """Return the response and parsed lines of an export"""
+        res = self.client.get(EXPORT_URL)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        return res, [json.loads(line) for line in lines]
+
+    def test_export_matches_detail_serializer(self):
+        """Test each exported line matches the recipe detail output"""
+        user2 = get_user_model().objects.create_user(
+            'user2@test.com',
+            'testpass'
+        )
+        sample_recipe(user=user2)
+        recipe1 = sample_recipe(user=self.user, link='http://x.com')
+        recipe1.tags.add(sample_Tags(user=self.user))
+        recipe1.ingredients.add(sample_Ingredients(user=self.user))
+        recipe2 = sample_recipe(
+            user=self.user,
+            price=3,
+            image='uploads/recipe/a.jpg',
+            image_medium='uploads/recipe/a.medium.jpg',
+            image_status=Recipe.IMAGE_READY
+        )
+
+        res, lines = self._export()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        expected = RecipeDetailSerializer(
+            [recipe1, recipe2],
+            many=True,
+            context={'request': res.wsgi_request}
+        )
+        self.assertEqual(lines, json.loads(json.dumps(expected.data)))
+
+    def test_export_query_count_per_chunk(self):
+        """Test the export issues a fixed number of queries per chunk"""
+        tag = sample_Tags(user=self.user)
+        for i in range(5):
+            sample_recipe(user=self.user).tags.add(tag)
+
+        with self.settings(RECIPE_EXPORT_CHUNK_SIZE=2):
+            with self.assertNumQueries(1 + 3 * 2):
+                res, lines = self._export()
+
+        self.assertEqual(len(lines), 5)
+
+
+class RecipeConditionalGetTests(TestCase):
+    """Test conditional requests against the recipe endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+
+    def test_list_not_modified(self):
+        """Test a matching ETag returns 304 without querying recipes"""
+        res = self.client.get(RECIPE_URL)
+        self.assertIn('ETag', res)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_last_modified_after_its_second(self):
+        """Test Last-Modified is only sent once its second has passed"""
+        modified_at = LibraryVersion.objects.for_user(self.user).modified_at
+        now = 'recipe.views.timezone.now'
+
+        with patch(now, return_value=modified_at):
+            res = self.client.get(RECIPE_URL)
+        self.assertNotIn('Last-Modified', res)
+
+        with patch(now, return_value=modified_at + timedelta(seconds=1)):
+            res = self.client.get(RECIPE_URL)
+            self.assertIn('Last-Modified', res)
+            res = self.client.get(
+                RECIPE_URL,
+                HTTP_IF_MODIFIED_SINCE=res['Last-Modified']
+            )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_changes_etag(self):
+        """Test changing a recipe relation invalidates the ETag"""
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        self.recipe.tags.add(sample_Tags(user=self.user))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def test_etag_depends_on_query(self):
+        """Test the ETag of one page does not match another"""
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        res = self.client.get(
+            RECIPE_URL,
+            {'page_size': 1},
+            HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bulk_write_changes_etag(self):
+        """Test bulk writes, which send no signals, bump the version"""
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        self.client.delete(BULK_URL, [self.recipe.id], format='json')
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+
+class RecipeSearchApiTests(TestCase):
+    """Test full text search over recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _search(self, q, **params):
+        res = self.client.get(RECIPE_URL, {'q': q, **params})
+        return [r['id'] for r in res.data['results']], res
+
+    def test_search_title_and_relations(self):
+        """Test searching matches titles, tags and ingredients"""
+        curry = sample_recipe(user=self.user, title='Vegetable curry')
+        soup = sample_recipe(user=self.user, title='Tomato soup')
+        soup.tags.add(sample_Tags(user=self.user, name='Comfort'))
+        steak = sample_recipe(user=self.user, title='Steak')
+        steak.ingredients.add(sample_Ingredients(user=self.user,
+                                                 name='Potatoes'))
+
+        self.assertEqual(self._search('curries')[0], [curry.id])
+        self.assertEqual(self._search('comfort')[0], [soup.id])
+        self.assertEqual(self._search('potato')[0], [steak.id])
+
+    def test_search_ranks_title_first(self):
+        """Test recipes matching on the title rank above tag matches"""
+        tagged = sample_recipe(user=self.user, title='Pasta bake')
+        tagged.tags.add(sample_Tags(user=self.user, name='Chicken'))
+        titled = sample_recipe(user=self.user, title='Roast chicken')
+
+        self.assertEqual(self._search('chicken')[0], [titled.id, tagged.id])
+
+    def test_search_follows_renamed_tag(self):
+        """Test renaming a tag updates the recipes using it"""
+        tag = sample_Tags(user=self.user, name='Lunch')
+        recipe = sample_recipe(user=self.user, title='Sandwich')
+        recipe.tags.add(tag)
+
+        tag.name = 'Picnic'
+        tag.save()
+
+        self.assertEqual(self._search('picnic')[0], [recipe.id])
+        self.assertEqual(self._search('lunch')[0], [])
+
+    def test_search_pages_by_rank(self):
+        """Test search results can be paged through by rank"""
+        for i in range(3):
+            sample_recipe(user=self.user, title=f'Bread {i}')
+        sample_recipe(user=self.user, title='Bread bread bread')
+
+        ids, res = self._search('bread', page_size=2)
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [r['id'] for r in res.data['results']]
+
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(len(set(ids)), 4)
+
+    def test_search_limited_to_user(self):
+        """Test search does not return other users' recipes"""
+        user2 = get_user_model().objects.create_user(
+            'user2@test.com',
+            'testpass'
+        )
+        sample_recipe(user=user2, title='Pancakes')
+
+        self.assertEqual(self._search('pancakes')[0], [])
+
+
+class RecipeFilterApiTests(TestCase):
+    """Test filtering recipes by tags and ingredients"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan = sample_Tags(user=self.user, name='Vegan')
+        self.quick = sample_Tags(user=self.user, name='Quick')
+        self.both = sample_recipe(user=self.user, title='Salad')
+        self.both.tags.add(self.vegan, self.quick)
+        self.vegan_only = sample_recipe(user=self.user, title='Stew')
+        self.vegan_only.tags.add(self.vegan)
+
+    def _ids(self, **params):
+        res = self.client.get(RECIPE_URL, params)
+        return [r['id'] for r in res.data['results']]
+
+    def test_match_any_has_no_duplicates(self):
+        """Test a recipe matching several ids is returned once"""
+        ids = self._ids(tags=f'{self.vegan.id},{self.quick.id}')
+
+        self.assertEqual(ids, [self.vegan_only.id, self.both.id])
+
+    def test_match_all(self):
+        """Test match=all only returns recipes having every id"""
+        ids = self._ids(
+            tags=f'{self.vegan.id},{self.quick.id},{self.quick.id}',
+            match='all'
+        )
+
+        self.assertEqual(ids, [self.both.id])
+
+    def test_match_all_tags_and_ingredients(self):
+        """Test match=all applies to tags and ingredients together"""
+        tofu = sample_Ingredients(user=self.user, name='Tofu')
+        self.vegan_only.ingredients.add(tofu)
+
+        ids = self._ids(
+            tags=str(self.vegan.id),
+            ingredients=str(tofu.id),
+            match='all'
+        )
+
+        self.assertEqual(ids, [self.vegan_only.id])
+
+    def test_invalid_filters(self):
+        """Test invalid ids or match values are rejected"""
+        res = self.client.get(RECIPE_URL, {'tags': 'a,b'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPE_URL, {'match': 'some'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,87 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db import routers
+from core.models import Recipe
+from recipe.views import RecipeViewSet
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+# The test database stands in for the replica so the reads see the data
+@override_settings(DATABASE_REPLICAS=['default'], REPLICA_PIN_SECONDS=60)
+class RecipeReplicaReadTests(TestCase):
+    """Test recipe reads are served from replicas"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+
+    def _read_alias(self, url):
+        """Request the url, returning where its reads were routed"""
+        aliases = []
+        get_queryset = RecipeViewSet.get_queryset
+
+        def record(view):
+            aliases.append(routers.replica_alias())
+            return get_queryset(view)
+
+        with patch.object(RecipeViewSet, 'get_queryset', record):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return aliases[0]
+
+    def test_reads_use_replica(self):
+        """Test list and retrieve read from a replica"""
+        self.assertEqual(self._read_alias(RECIPE_URL), 'default')
+        self.assertEqual(
+            self._read_alias(reverse(
+                'recipe:recipe-detail',
+                args=[self.recipe.id]
+            )),
+            'default'
+        )
+        self.assertIsNone(routers.replica_alias())
+
+    def test_reads_after_write_use_primary(self):
+        """Test a user's reads stay on the primary after their write"""
+        res = self.client.post(RECIPE_URL, {
+            'title': 'Cake',
+            'time_minutes': 30,
+            'price': 5,
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertIsNone(self._read_alias(RECIPE_URL))
+
+        other = get_user_model().objects.create_user(
+            'other@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+        self.assertEqual(self._read_alias(RECIPE_URL), 'default')
+
+    def test_failed_write_does_not_pin(self):
+        """Test a rejected write leaves reads on the replica"""
+        res = self.client.post(RECIPE_URL, {'title': ''})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(self._read_alias(RECIPE_URL), 'default')
@@ -1,3 +1,6 @@
+import json
+from base64 import b64encode
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
@@ -49,7 +52,7 @@ class PrivateTagsApiTests(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test that tags returned are for the authenticated user"""
@@ -62,8 +65,8 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
 
     def test_create_tag_successful(self):
         """"Test creating a new tag"""
@@ -100,8 +103,8 @@ class PrivateTagsApiTests(TestCase):
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
 
     def test_retrive_tags_assigned_unique(self):
         """Test filtering tags by assigned return unique items"""
@@ -124,4 +127,41 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_tags_paginated_with_duplicate_names(self):
+        """Test paging through tags sharing a name returns each once"""
+        for name in ('Lunch', 'Lunch', 'Lunch', 'Dinner', 'Brunch'):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        ids = [t['id'] for t in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [t['id'] for t in res.data['results']]
+
+        expected = Tag.objects.order_by('-name', 'id')\
+            .values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+
+    def test_tags_invalid_cursor(self):
+        """Test a cursor with values the database rejects is not found"""
+        Tag.objects.create(user=self.user, name='Lunch')
+
+        for position in (['a\x00', 1], [True, 1], ['a', {}]):
+            cursor = b64encode(json.dumps({'p': position}).encode('utf-8'))
+            res = self.client.get(TAGS_URL, {'cursor': cursor.decode()})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tags_not_modified(self):
+        """Test tags are not listed again until the library changes"""
+        Tag.objects.create(user=self.user, name='Breakfast')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Tag.objects.create(user=self.user, name='Lunch')
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
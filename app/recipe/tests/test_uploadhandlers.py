@@ -0,0 +1,49 @@
+import hashlib
+
+from django.test import TestCase
+
+from recipe.uploadhandlers import RecipeImageUploadHandler, UploadTooLarge, \
+    MULTIPART_OVERHEAD
+
+
+class RecipeImageUploadHandlerTests(TestCase):
+    """Test the streaming recipe image upload handler"""
+
+    def _start(self, max_size):
+        handler = RecipeImageUploadHandler(max_size=max_size)
+        handler.new_file('image', 'photo.jpg', 'image/jpeg', None)
+        return handler
+
+    def test_hashes_streamed_content(self):
+        """Test the uploaded file carries the SHA-256 of its content"""
+        handler = self._start(max_size=100)
+        chunks = [b'a' * 40, b'b' * 40, b'c' * 20]
+        start = 0
+        for chunk in chunks:
+            handler.receive_data_chunk(chunk, start)
+            start += len(chunk)
+
+        file = handler.file_complete(start)
+
+        content = b''.join(chunks)
+        self.assertEqual(file.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(file.read(), content)
+        file.close()
+
+    def test_rejects_file_over_limit(self):
+        """Test a file is rejected at the chunk crossing the limit"""
+        handler = self._start(max_size=100)
+        handler.receive_data_chunk(b'a' * 60, 0)
+
+        with self.assertRaises(UploadTooLarge):
+            handler.receive_data_chunk(b'a' * 60, 60)
+
+    def test_rejects_content_length_over_limit(self):
+        """Test a request is rejected from its Content-Length alone"""
+        handler = RecipeImageUploadHandler(max_size=100)
+
+        handler.handle_raw_input(None, {}, 100 + MULTIPART_OVERHEAD, b'')
+        with self.assertRaises(UploadTooLarge):
+            handler.handle_raw_input(
+                None, {}, 101 + MULTIPART_OVERHEAD, b''
+            )
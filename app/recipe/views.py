@@ -1,19 +1,160 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, IntegerField, Prefetch, Q, \
+    Value
+from django.db.models.functions import Cast
+from django.http import FileResponse, Http404, HttpResponse, \
+    StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+
+from core.authentication import CachedTokenAuthentication
+from core.db import routers
+from core import images, metrics
+from core.models import Tag, Ingredient, Recipe, LibraryVersion
+from core.querybudget import QueryBudgetMixin
+from recipe import bulk, export, fastpath, filters, serializers
+from recipe.pagination import NameKeysetPagination, RecipeKeysetPagination
+from recipe.uploadhandlers import RecipeImageUploadHandler
+
+
+class ConditionalGetMixin:
+    """Answer conditional reads from the version of the user's library
+
+    A matching If-None-Match or If-Modified-Since gets a 304 before the
+    list query or any serialization runs.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        """Run the handler unless the client copy is still current"""
+        library = LibraryVersion.objects.for_user(request.user)
+        validator = ':'.join((
+            str(request.user.pk),
+            str(library.version),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+        ))
+        etag = '"%s"' % hashlib.md5(validator.encode()).hexdigest()
+        last_modified = library.modified_at and \
+            int(library.modified_at.timestamp())
+
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response['ETag'] = etag
+            # A later write within the same second would get a stale 304 on
+            # If-Modified-Since, so until that second is over only the ETag
+            # validates the response
+            if last_modified and \
+                    last_modified < int(timezone.now().timestamp()):
+                response['Last-Modified'] = http_date(last_modified)
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+
+        return response
+
+
+class ReplicaReadMixin:
+    """Serve list and retrieve from a read replica
+
+    A user's reads stay on the primary for REPLICA_PIN_SECONDS after any
+    write they make, so they always see their own changes.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        routers.use_primary()
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions and \
+                not routers.is_pinned(request.user.pk):
+            routers.use_replica()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        routers.use_primary()
+        if request.method not in SAFE_METHODS and \
+                request.user.is_authenticated and response.status_code < 400:
+            routers.pin_to_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ValuesListMixin:
+    """Render list pages from values() rows when RECIPE_VALUES_LIST is set
+
+    No model instances are built and the serializer fields only format the
+    values, giving the same output as the serializer at a fraction of the
+    CPU time.
+    """
+    values_relations = ()
 
-from core.models import Tag, Ingredient, Recipe
-from recipe import serializers
+    def list(self, request, *args, **kwargs):
+        if not settings.RECIPE_VALUES_LIST:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = OrderedDict(
+            (name, field)
+            for name, field in self.get_serializer().fields.items()
+            if not field.write_only
+        )
+        ordering = self.paginator.get_ordering(self)
+        rows = self.paginate_queryset(fastpath.values_queryset(
+            queryset,
+            fields,
+            self.values_relations,
+            [field.lstrip('-') for field in ordering]
+        ))
+
+        started = time.perf_counter()
+        data = fastpath.to_representation(
+            fields,
+            rows,
+            self.values_relations,
+            queryset.model
+        )
+        metrics.add_serialize_time(request, time.perf_counter() - started)
+
+        return self.get_paginated_response(data)
 
 
-class BaseRecipeViewSet(viewsets.GenericViewSet,
+class BaseRecipeViewSet(QueryBudgetMixin,
+                        ReplicaReadMixin,
+                        ConditionalGetMixin,
+                        ValuesListMixin,
+                        viewsets.GenericViewSet,
                         mixins.ListModelMixin,
                         mixins.CreateModelMixin):
     """Base view set for user owned recipe attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = NameKeysetPagination
+    # Budgets include the token lookup of a cold authentication cache
+    query_budgets = {
+        'list': (3, 0),
+        'create': (3, 0),
+    }
 
     def get_queryset(self):
         """retrun objects for the current authenticated user only"""
@@ -22,10 +163,12 @@ class BaseRecipeViewSet(viewsets.GenericViewSet,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            column = f'{queryset.model._meta.model_name}_id'
+            queryset = queryset.filter(
+                id__in=self.assigned_through.objects.values(column)
+            )
 
-        return queryset.filter(user=self.request.user)\
-            .order_by('-name').distinct()
+        return queryset.filter(user=self.request.user).order_by('-name', 'id')
 
     def perform_create(self, serializer):
         """creat a new object"""
@@ -37,6 +180,7 @@ class TagViewSet(BaseRecipeViewSet):
 
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    assigned_through = Recipe.tags.through
 
 
 class IngredientViewSet(BaseRecipeViewSet):
@@ -44,34 +188,147 @@ class IngredientViewSet(BaseRecipeViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    assigned_through = Recipe.ingredients.through
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(QueryBudgetMixin,
+                    ReplicaReadMixin,
+                    ConditionalGetMixin,
+                    ValuesListMixin,
+                    viewsets.ModelViewSet):
     """Manage Recipes in the database"""
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.defer('search_vector')
     serializer_class = serializers.RecipeSerializer
+    values_relations = (
+        ('ingredients', Recipe.ingredients.through, 'ingredient_id'),
+        ('tags', Recipe.tags.through, 'tag_id'),
+    )
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeKeysetPagination
+    # Write budgets cover replacing both relations of a recipe
+    query_budgets = {
+        'list': (6, 0),
+        'retrieve': (5, 0),
+        'create': (14, 0),
+        'update': (21, 0),
+        'partial_update': (21, 0),
+        'destroy': (11, 0),
+        'bulk': (12, 0),
+        'upload_image': (12, 0),
+        'export': (2, 0),
+    }
 
     def _params_to_ints(self, qs):
         """Convert a list of strings IDs to a list of integers"""
-        return [int(str_id) for str_id in qs.split(',')]
+        try:
+            return [int(str_id) for str_id in qs.split(',')]
+        except ValueError:
+            raise ValidationError('Expected a comma separated list of ids.')
 
     def get_queryset(self):
         """Retrieve the recipes for the authenticated user"""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        search = self.request.query_params.get('q')
+        match = self.request.query_params.get('match', filters.MATCH_ANY)
         queryset = self.queryset
 
+        if match not in (filters.MATCH_ANY, filters.MATCH_ALL):
+            raise ValidationError({'match': 'Expected "any" or "all".'})
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = filters.filter_related(queryset, 'tags', tag_ids, match)
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = filters.filter_related(
+                queryset,
+                'ingredients',
+                ingredient_ids,
+                match
+            )
+
+        queryset = self._prefetch_for_action(queryset)
+        queryset = queryset.filter(user=self.request.user).order_by('-id')
+        if search:
+            queryset = self._search(queryset, search)
+
+        return queryset
+
+    def _search(self, queryset, search):
+        """Filter recipes matching the search and order them by rank
 
-        return queryset.filter(user=self.request.user)
+        The rank is scaled to an integer so the pagination cursor compares
+        exactly, float4 ranks do not survive the round trip through JSON.
+        """
+        query = SearchQuery(search, config=settings.RECIPE_SEARCH_CONFIG)
+        rank = SearchRank(F('search_vector'), query) * \
+            Value(1000000, output_field=FloatField())
+        self.keyset_ordering = ('-rank', '-id')
+
+        return queryset.filter(search_vector=query).annotate(
+            rank=Cast(rank, IntegerField())
+        ).order_by(*self.keyset_ordering)
+
+    def get_field_names(self):
+        """Return the fields requested with ?fields= on reads, else None"""
+        param = self.request.query_params.get('fields')
+        if not param or self.action not in ('list', 'retrieve'):
+            return None
+
+        names = [name.strip() for name in param.split(',') if name.strip()]
+        available = self.get_serializer_class().Meta.fields
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValidationError({'fields': [
+                f'Unknown field "{name}".' for name in unknown
+            ]})
+
+        return names
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_field_names()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def _prefetch_for_action(self, queryset):
+        """Prefetch the relations the serializer for this action renders
+
+        With ?fields= only the requested columns are loaded and relations
+        that are not requested are not fetched.
+        """
+        if self.action in ('upload_image', 'bulk', 'export'):
+            return queryset
+
+        relations = ('ingredients', 'tags')
+        fields = self.get_field_names()
+        if fields is not None:
+            queryset = queryset.only('id', *(
+                name for name in fields if name not in relations
+            ))
+            relations = [name for name in relations if name in fields]
+
+        if self.action == 'retrieve':
+            return queryset.prefetch_related(*(
+                Prefetch(name, queryset=model.objects.order_by('id'))
+                for name, model in (('ingredients', Ingredient), ('tags', Tag))
+                if name in relations
+            ))
+
+        return self._prefetch_ids(queryset, relations)
+
+    def _prefetch_ids(self, queryset, relations=('ingredients', 'tags')):
+        """Prefetch only the ids of the recipe tags and ingredients"""
+        return queryset.prefetch_related(*(
+            Prefetch(name, queryset=model.objects.only('id').order_by('id'))
+            for name, model in (('ingredients', Ingredient), ('tags', Tag))
+            if name in relations
+        ))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
 
     def get_serializer_class(self):
         """return appropriate serializer class for Recipe"""
@@ -79,16 +336,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkSerializer
 
         return self.serializer_class
 
     def perform_create(self, serializer):
         """Create a new recipe"""
-        serializer.save(user=self.request.user)
+        with LibraryVersion.objects.batch(), Recipe.objects.batch():
+            serializer.save(user=self.request.user)
+
+    def perform_update(self, serializer):
+        """Update a recipe, bumping its version and search document once"""
+        with LibraryVersion.objects.batch(), Recipe.objects.batch():
+            serializer.save()
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
+        # Must be set before the body is parsed by accessing request.data
+        request.upload_handlers = [RecipeImageUploadHandler(request)]
         recipe = self.get_object()
         serializer = self.get_serializer(
             recipe,
@@ -96,7 +363,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
         if serializer.is_valid():
-            serializer.save()
+            # Inline processing bumps the library version again
+            with LibraryVersion.objects.batch():
+                serializer.save()
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -106,3 +375,134 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        """Create, update or delete a list of recipes in one transaction"""
+        max_items = settings.RECIPE_BULK_MAX_ITEMS
+        if not isinstance(request.data, list) or \
+                len(request.data) > max_items:
+            return Response(
+                {'non_field_errors': [
+                    f'Expected a list of at most {max_items} items.'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if request.method == 'DELETE':
+            return self._bulk_delete(request.data)
+
+        partial = request.method == 'PATCH'
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            partial=partial
+        )
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        items = serializer.validated_data
+        if partial:
+            errors = bulk.check_duplicate_ids(items)
+            if any(errors):
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        errors = bulk.check_related_ids(request.user, items)
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if partial:
+            missing = bulk.update_recipes(request.user, items)
+            if missing:
+                errors = [
+                    {'id': ['Not found.']} if item['id'] in missing else {}
+                    for item in items
+                ]
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+            ids = [item['id'] for item in items]
+            response_status = status.HTTP_200_OK
+        else:
+            recipes = bulk.create_recipes(request.user, items)
+            ids = [recipe.id for recipe in recipes]
+            response_status = status.HTTP_201_CREATED
+
+        # Not get_queryset(), whose list filters could hide the written rows
+        recipes = self._prefetch_ids(
+            self.queryset.filter(user=request.user)
+        ).in_bulk(ids)
+        serializer = serializers.RecipeSerializer(
+            [recipes[pk] for pk in ids],
+            many=True
+        )
+
+        return Response(serializer.data, status=response_status)
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """Stream every recipe of the user as newline delimited JSON"""
+        response = StreamingHttpResponse(
+            export.iter_ndjson(
+                self.get_queryset(),
+                settings.RECIPE_EXPORT_CHUNK_SIZE,
+                request
+            ),
+            content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = \
+            'attachment; filename="recipes.ndjson"'
+
+        return response
+
+    def _bulk_delete(self, ids):
+        """Delete the listed recipes of the authenticated user"""
+        if not all(isinstance(pk, int) for pk in ids):
+            return Response(
+                {'non_field_errors': ['Expected a list of recipe ids.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        bulk.delete_recipes(self.request.user, ids)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RecipeMediaView(QueryBudgetMixin, APIView):
+    """Serve the image files of the authenticated user's recipes
+
+    Outside the 'django' MEDIA_SERVE_MODE only the authorization runs here
+    and the file is sent by the front-end server.
+    """
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    query_budgets = {'get': (2, 0)}
+
+    def get(self, request, path):
+        name = posixpath.normpath(path).lstrip('/')
+        lookup = Q()
+        for field in ('image',) + images.VARIANT_FIELDS:
+            lookup |= Q(**{field: name})
+        if not Recipe.objects.filter(lookup, user=request.user).exists():
+            raise Http404
+
+        file_path = os.path.join(settings.MEDIA_ROOT, name)
+        mode = settings.MEDIA_SERVE_MODE
+        if mode == 'x-accel':
+            response = HttpResponse()
+            response['X-Accel-Redirect'] = \
+                settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + name
+        elif mode == 'x-sendfile':
+            response = HttpResponse()
+            response['X-Sendfile'] = file_path
+        else:
+            try:
+                response = FileResponse(open(file_path, 'rb'))
+            except FileNotFoundError:
+                raise Http404
+
+        content_type, _ = mimetypes.guess_type(name)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        # File names are uuids or content hashes and never change content
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
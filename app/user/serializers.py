@@ -3,8 +3,10 @@ from django.utils.translation import ugettext_lazy as _
 
 from rest_framework import serializers
 
+from core.metrics import SerializeTimeMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(SerializeTimeMixin, serializers.ModelSerializer):
     """Serializer for the users object"""
 
     class Meta:
@@ -19,13 +21,10 @@ class UserSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         """Update a user, setting the password correctly and return it """
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
-
         if password:
-            user.set_password(password)
-            user.save()
+            instance.set_password(password)
 
-        return user
+        return super().update(instance, validated_data)
 
 
 class AuthTokenSerializer(serializers.Serializer):
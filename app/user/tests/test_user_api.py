@@ -1,9 +1,13 @@
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 
 
 CREATE_USER_URL = reverse('user:create')
@@ -72,6 +76,52 @@ class PublicUserApiTests(TestCase):
         self.assertIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_create_token_reused(self):
+        """Test logging in again returns the existing token"""
+        payload = {'email': 'test@test.com', 'password': 'testpass'}
+        user = create_user(**payload)
+        first = self.client.post(TOKEN_URL, payload)
+        second = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(first.data['token'], second.data['token'])
+        self.assertEqual(Token.objects.filter(user=user).count(), 1)
+
+    def test_create_token_concurrent_first_login(self):
+        """Test a token inserted by a concurrent login is returned"""
+        payload = {'email': 'test@test.com', 'password': 'testpass'}
+        user = create_user(**payload)
+        concurrent = Token.objects.create(user=user)
+
+        # The concurrent token is inserted after this login looked for one
+        with patch('django.db.models.query.QuerySet.first') as first:
+            first.return_value = None
+            res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.data['token'], concurrent.key)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'core.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_login_rehashes_password(self):
+        """Test logging in upgrades the hash to the preferred hasher"""
+        payload = {'email': 'test@test.com', 'password': 'testpass'}
+        user = create_user(**payload)
+        user.password = make_password('testpass', hasher='md5')
+        user.save()
+        cost = {
+            'PBKDF2_ITERATIONS': 1000, 'ARGON2_TIME_COST': 2,
+            'ARGON2_MEMORY_COST': 512, 'ARGON2_PARALLELISM': 2,
+            'BCRYPT_ROUNDS': 12,
+        }
+
+        with override_settings(PASSWORD_HASHER_COST=cost):
+            res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
     def test_create_token_invalid(self):
         """Test that token is not created if invalid credentials are given"""
         create_user(email='test@test.com', password='testpass')
@@ -1,26 +1,46 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication, get_token_key
+from core.querybudget import QueryBudgetMixin
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(QueryBudgetMixin, generics.CreateAPIView):
     """Creat a new user in the system."""
     serializer_class = UserSerializer
+    query_budgets = {'post': (2, 0)}
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(QueryBudgetMixin, ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    query_budgets = {'post': (4, 0)}
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+        return Response({'token': get_token_key(user)})
+
+
+class ManageUserView(QueryBudgetMixin, generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
+    query_budgets = {
+        'get': (2, 0),
+        'put': (3, 0),
+        'patch': (3, 0),
+    }
 
     def get_object(self):
         """Retrieve and return authentivated user"""